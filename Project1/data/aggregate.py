@@ -0,0 +1,126 @@
+from __future__ import annotations
+import sys
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import merge_sheets
+import sheet_cache
+
+KEYS = ["Year", "Month", "State"]
+SECTORS = ["Residential", "Commercial", "Industrial", "Transportation", "Total"]
+
+CUBE_NAME = "residential_cube.csv"
+
+# Hash of residential_consumption.csv, of each year's rows in it and of this script, as of the last build. Nothing is
+# read while the file's and the script's hashes match, otherwise only years whose rows changed (or are new) are
+# aggregated again, or every year when the script changed...
+MANIFEST_NAME = ".cube_manifest.json"
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def aggregate(rows: pd.DataFrame) -> pd.DataFrame:
+    # Year x month x state totals of every sector...
+    import pandas as pd
+
+    return rows.groupby(KEYS, sort=True)[SECTORS].sum().reset_index()
+
+
+def year_hashes(rows: pd.DataFrame) -> dict[str, str]:
+    # One hash per year over all of its rows, all rows are hashed at once and then combined per year...
+    import pandas as pd
+
+    row_hashes = pd.util.hash_pandas_object(rows, index=False)
+    combined = row_hashes.groupby(rows["Year"].to_numpy()).agg(lambda h: hex(int(h.to_numpy().sum(dtype="uint64"))))
+    return {str(year): h for year, h in combined.items()}
+
+
+def update_cube(cube: pd.DataFrame, rows: pd.DataFrame) -> pd.DataFrame:
+    # Replace the years in rows with their new totals, every other year in the cube is kept as is...
+    import pandas as pd
+
+    years = rows["Year"].unique()
+    kept = cube[~cube["Year"].isin(years)] if(cube is not None) else None
+    return pd.concat([kept, aggregate(rows)], ignore_index=True).sort_values(KEYS, ignore_index=True)
+
+
+def read_cube(cube_file: Path) -> pd.DataFrame:
+    import pandas as pd
+
+    return pd.read_csv(cube_file) if(cube_file.exists()) else None
+
+
+def add_workbooks(cube_file: Path, paths: list[Path], cache_dir: Path):
+    # The years in the workbooks replace (or are added to) those in the cube...
+    rows = merge_sheets.merge(merge_sheets.read_sheets(paths, cache_dir=cache_dir))
+    print(f"Adding years: {sorted(rows['Year'].unique())}")
+    update_cube(read_cube(cube_file), rows).to_csv(cube_file, index=False)
+
+
+def refresh_cube(cube_file: Path, source_file: Path, previous: dict[str, str]) -> dict[str, str]:
+    # Aggregates the years of source_file whose hash isn't the one in previous, returns the new hash of every year.
+    # Without any previous hashes the cube is built from scratch...
+    import pandas as pd
+
+    cube = read_cube(cube_file) if(len(previous) > 0) else None
+    rows = pd.read_csv(source_file)
+    hashes = year_hashes(rows)
+    changed = [int(year) for year, h in hashes.items() if(previous.get(year) != h)]
+    removed = [int(year) for year in previous if(year not in hashes)]
+
+    if(len(changed) > 0 or len(removed) > 0):
+        print(f"Aggregating years: {changed}")
+        if(cube is not None):
+            cube = cube[~cube["Year"].isin(removed)]
+        cube = update_cube(cube, rows[rows["Year"].isin(changed)])
+        cube.to_csv(cube_file, index=False)
+        print(f"Wrote {len(cube)} rows to {cube_file}")
+    else:
+        print("Cube up to date.")
+
+    return hashes
+
+
+def main(args):
+    # With no workbooks the cube is brought up to date with residential_consumption.csv, otherwise the years in the
+    # given workbooks are added (or replaced) without reading anything else...
+    parser = argparse.ArgumentParser(description="Aggregate residential consumption into a year x month x state cube.")
+    parser.add_argument("workbooks", nargs="*", help="EIA workbooks whose years are added to the cube")
+    parser.add_argument("--force", action="store_true", help="Aggregate every year even if the cube is up to date")
+    opts = parser.parse_args(args[1:])
+
+    this_dir = Path(args[0]).parent
+    cube_file = this_dir / CUBE_NAME
+    manifest_file = this_dir / MANIFEST_NAME
+    source_file = this_dir / "residential_consumption.csv"
+
+    manifest = {}
+    if(manifest_file.exists() and cube_file.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    source_hash = file_hash(source_file)
+    script_hash = file_hash(Path(__file__))
+    if(opts.force or manifest.get("script_sha1") != script_hash):
+        manifest = {}
+    if(len(opts.workbooks) == 0 and manifest.get("source_sha1") == source_hash):
+        print("Cube up to date.")
+        return
+
+    if(len(opts.workbooks) > 0):
+        cache_dir = this_dir / sheet_cache.CACHE_DIR
+        cache_dir.mkdir(exist_ok=True)
+        add_workbooks(cube_file, [Path(p) for p in opts.workbooks], cache_dir)
+        return
+
+    hashes = refresh_cube(cube_file, source_file, manifest.get("years", {}))
+
+    with open(manifest_file, "w") as f:
+        json.dump({"source_sha1": source_hash, "script_sha1": script_hash, "years": hashes}, f, indent=4)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
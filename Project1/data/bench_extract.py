@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import extract_data
+import openpyxl
+import sys
+import time
+
+# Rows of the synthetic sheets that extract_data doesn't keep, about as many as the real expenditure table has...
+FILLER_ROWS = 160
+YEARS_PER_RELEASE = 8
+
+
+def make_release(first_year: int, rng: np.random.Generator) -> pd.DataFrame:
+    # Synthetic expenditure table as pd.read_excel(header=2, index_col=0) returns it. The kept rows are shuffled in
+    # among filler rows, with repeated labels and blank spacer rows like the real sheet...
+    labels = list(extract_data.EX_COLS) + [f"Other item {i}" for i in range(FILLER_ROWS)]
+    labels += ["Income before taxes", "Income after taxes*"] * 2 + [np.nan] * 20
+    labels = [labels[i] for i in rng.permutation(len(labels))]
+
+    years = list(range(first_year, first_year + YEARS_PER_RELEASE))
+    values = rng.integers(100, 60000, (len(labels), len(years))).astype(object)
+    values[[isinstance(label, float) for label in labels]] = np.nan
+
+    return pd.DataFrame(values, index=pd.Index(labels, name="Item"), columns=years)
+
+
+def write_release(path: Path, df: pd.DataFrame):
+    # Same layout as the BLS workbooks: a title, a blank row, then the header row the data is read from...
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+
+    sheet.append([f"Average annual expenditures, Consumer Expenditure Surveys, {df.columns[0]}-{df.columns[-1]}"])
+    sheet.append([])
+    sheet.append(["Item", *df.columns])
+    for label, row in zip(df.index, df.itertuples(index=False)):
+        sheet.append([None if(isinstance(label, float)) else label, *(None if(pd.isna(v)) else v for v in row)])
+
+    workbook.save(path)
+
+
+def legacy_extract(df: pd.DataFrame) -> pd.DataFrame:
+    # The previous extract_data: one df.loc per row, a new frame built from them, then transposed...
+    cols = [df.loc[col] for col in extract_data.EX_COLS]
+
+    final_df = pd.DataFrame(cols, columns=df.columns, index=extract_data.EX_COLS).T
+    final_df.index = final_df.index.rename("Year")
+
+    return final_df
+
+
+def best(func, repeats: int) -> tuple[float, object]:
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(args):
+    # usage: bench_extract.py [RELEASES] [REPEATS]
+    releases = int(args[1]) if(len(args) > 1) else 12
+    repeats = int(args[2]) if(len(args) > 2) else 3
+    rng = np.random.default_rng(0)
+
+    frames = [make_release(2000 + i, rng) for i in range(releases)]
+    names = [f"cu-all-multi-year-{2000 + i}-{2000 + i + YEARS_PER_RELEASE - 1}.xlsx" for i in range(releases)]
+
+    # Row selection alone, on sheets already in memory...
+    legacy_time, legacy = best(lambda: [legacy_extract(df) for df in frames], repeats)
+    select_time, selected = best(lambda: [extract_data.select_rows(df) for df in frames], repeats)
+    long_time, long = best(lambda: extract_data.to_long(selected, names), repeats)
+
+    print(f"{releases} releases of {len(frames[0])} rows x {YEARS_PER_RELEASE} years, in memory:")
+    print(f"{'loc + T':<12} {legacy_time * 1000:9.2f}ms")
+    print(f"{'reindex':<12} {select_time * 1000:9.2f}ms")
+    print(f"{'to_long':<12} {long_time * 1000:9.2f}ms  {len(long)} rows")
+
+    same = all(a.astype(np.float64).equals(b.astype(np.float64)) for a, b in zip(legacy, selected))
+    print(f"Same values: {same}")
+
+    # Newest release wins for overlapping years...
+    newest = long.groupby("Year")["Release"].first()
+    print(f"Newest release kept: {all(newest[year] == names[min(year - 2000, releases - 1)] for year in newest.index)}")
+
+    with TemporaryDirectory() as tmp:
+        paths = [Path(tmp) / name for name in names]
+        for path, df in zip(paths, frames):
+            write_release(path, df)
+
+        legacy_time, legacy = best(
+            lambda: [legacy_extract(pd.read_excel(str(p), **extract_data.READ_PARAMS)) for p in paths], 1
+        )
+        serial_time, serial = best(lambda: [extract_data.extract(p) for p in paths], 1)
+        pool_time, pooled = best(lambda: extract_data.extract_all(paths), 1)
+
+        print(f"{releases} workbooks, read and extracted:")
+        for label, elapsed in [("legacy", legacy_time), ("serial", serial_time), ("pool", pool_time)]:
+            print(f"{label:<12} {elapsed:8.2f}s {len(paths) / elapsed:8.2f} files/s")
+
+        same = all(a.astype(np.float64).equals(b.astype(np.float64)) and b.equals(c) for a, b, c in zip(legacy, serial, pooled))
+        print(f"Same values: {same}")
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
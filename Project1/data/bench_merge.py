@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import merge_sheets
+import openpyxl
+import sys
+import time
+
+# Header groups in the monthly utility sheets, only the "All Technologies" customer counts and the utility
+# characteristics are kept by merge_sheets...
+CHARACTERISTICS = ["Year", "Month", "State", "Utility Number", "Utility Name", "Data Status"]
+TECHNOLOGIES = ["Photovoltaic", "Wind", "Other", "All Technologies"]
+MEASURES = ["Capacity MW", "Customers"]
+SECTORS = ["Residential", "Commercial", "Industrial", "Transportation", "Total"]
+
+
+def make_sheet(year: int, utilities: int, rng: np.random.Generator, blank: float = 0.05) -> pd.DataFrame:
+    # Synthetic sheet as pd.read_excel(header=[0, 1, 2, 3]) returns it, with a fraction of the numeric entries left
+    # as "." like the real sheets...
+    rows = 12 * utilities
+    columns = [("Utility Characteristics", "", "", name) for name in CHARACTERISTICS]
+    columns += [(tech, measure, "", sector) for tech in TECHNOLOGIES for measure in MEASURES for sector in SECTORS]
+
+    data = {
+        columns[0]: np.full(rows, year),
+        columns[1]: np.repeat(np.arange(1, 13), utilities),
+        columns[2]: rng.choice(["AK", "CA", "NY", "TX", "WA"], rows),
+        columns[3]: np.tile(np.arange(utilities), 12),
+        columns[4]: np.tile([f"Utility {i}" for i in range(utilities)], 12),
+        columns[5]: "Final",
+    }
+    for column in columns[len(CHARACTERISTICS):]:
+        values = rng.integers(0, 10000, rows).astype(object)
+        values[rng.random(rows) < blank] = "."
+        data[column] = values
+
+    return pd.DataFrame(data, columns=pd.MultiIndex.from_tuples(columns))
+
+
+def write_workbook(path: Path, df: pd.DataFrame):
+    # Write a sheet from make_sheet the way the real workbooks are laid out, each header label only in the first cell
+    # of its group (the cells after it are merged/blank) and the column names on the last header row...
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+
+    for level in range(df.columns.nlevels):
+        labels = list(df.columns.get_level_values(level))
+        sheet.append([
+            label if(level == df.columns.nlevels - 1 or i == 0 or labels[i - 1] != label) else None
+            for i, label in enumerate(labels)
+        ])
+    for row in df.itertuples(index=False):
+        sheet.append([None if(isinstance(v, float) and np.isnan(v)) else v for v in row])
+
+    workbook.save(path)
+
+
+def legacy_read(path: Path) -> pd.DataFrame:
+    # The previous merge_sheets read: every column of the sheet, then drop what isn't used...
+    df = pd.read_excel(str(path), header=[0, 1, 2, 3])
+    for column in df:
+        column = tuple(i.strip() for i in column)
+        if("Utility Characteristics" in column or "Utility Charateristics" in column):
+            continue
+        if(all((item in column) for item in ["All Technologies", "Customers"])):
+            df.loc[df[column] == ".", column] = 0
+            continue
+        del df[column]
+    df.columns = [a[-1].strip() for a in df]
+    return df
+
+
+def compare_reads(years: int, utilities: int, repeats: int, rng: np.random.Generator):
+    # Wall clock to read a directory of workbooks, the old way, with column projection, and projected in a pool...
+    with TemporaryDirectory() as tmp:
+        paths = []
+        for year in range(2020 - years, 2020):
+            paths.append(Path(tmp) / f"sheet{year}.xlsx")
+            write_workbook(paths[-1], make_sheet(year, utilities, rng))
+
+        size = sum(p.stat().st_size for p in paths) / 2 ** 20
+        print(f"{years} workbooks of {12 * utilities} rows ({size:.1f} MB):")
+
+        readers = {
+            "full read": lambda: [legacy_read(p) for p in paths],
+            "projected": lambda: [merge_sheets.read_sheet(p) for p in paths],
+            "pool": lambda: merge_sheets.read_sheets(paths),
+        }
+        results = {}
+        for label, read in readers.items():
+            elapsed, results[label] = best(read, repeats)
+            print(f"{label:<10} {elapsed:8.2f}s {len(paths) / elapsed:8.2f} files/s")
+
+        same = all(
+            a.astype(str).equals(b.astype(str)) for a, b in zip(results["full read"], results["pool"])
+        )
+        print(f"Same values: {same}")
+
+
+def legacy_merge(datasets: list[pd.DataFrame]) -> pd.DataFrame:
+    # The previous merge_sheets: delete unused columns one by one, then append sheet by sheet (DataFrame.append was a
+    # concat of the frame so far with the new sheet)...
+    cleaned = []
+    for df in datasets:
+        df = df.copy()
+        for column in df:
+            column = tuple(i.strip() for i in column)
+            if("Utility Characteristics" in column or "Utility Charateristics" in column):
+                continue
+            if(all((item in column) for item in ["All Technologies", "Customers"])):
+                df.loc[df[column] == ".", column] = 0
+                continue
+            del df[column]
+        df.columns = [a[-1].strip() for a in df]
+        cleaned.append(df)
+
+    all_data = cleaned[0]
+    for data in cleaned[1:]:
+        all_data = pd.concat([all_data, data], ignore_index=True)
+
+    return all_data
+
+
+def current_merge(datasets: list[pd.DataFrame]) -> pd.DataFrame:
+    return merge_sheets.merge([merge_sheets.clean_sheet(df) for df in datasets])
+
+
+def best(func, repeats: int) -> tuple[float, pd.DataFrame]:
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(args):
+    # usage: bench_merge.py [YEARS] [UTILITIES] [REPEATS] [WORKBOOKS]
+    years = int(args[1]) if(len(args) > 1) else 30
+    utilities = int(args[2]) if(len(args) > 2) else 500
+    repeats = int(args[3]) if(len(args) > 3) else 3
+    workbooks = int(args[4]) if(len(args) > 4) else 8
+    rng = np.random.default_rng(0)
+
+    datasets = [make_sheet(year, utilities, rng) for year in range(2020 - years, 2020)]
+    print(f"{years} sheets of {12 * utilities} rows:")
+
+    legacy_time, legacy = best(lambda: legacy_merge(datasets), repeats)
+    current_time, current = best(lambda: current_merge(datasets), repeats)
+
+    for label, elapsed, result in [("append", legacy_time, legacy), ("concat", current_time, current)]:
+        memory = result.memory_usage(deep=True).sum() / 2 ** 20
+        print(f"{label:<8} {elapsed * 1000:10.2f}ms {memory:8.1f} MB  {dict(result.dtypes.astype(str).value_counts())}")
+
+    print(f"Same values: {legacy.astype(str).equals(current.astype(str))}")
+
+    # Writing and reading real workbooks is slow, so these are only read once each...
+    if(workbooks > 0):
+        compare_reads(workbooks, utilities, 1, rng)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
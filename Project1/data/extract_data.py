@@ -1,49 +1,177 @@
-import pandas as pd
-import numpy as np
+from __future__ import annotations
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import argparse
+import hashlib
+import json
+import sheet_cache
+
+# Rows pulled out of the expenditure table...
+EX_COLS = [
+    # The total...
+    "Average annual expenditures", 
+    # General categories...
+    "Food",
+    "Housing",
+    "Apparel and services",
+    "Transportation",
+    "Healthcare",
+    "Entertainment",
+    "Personal care products and services",
+    "Reading",
+    "Education***",
+    "Tobacco products and smoking supplies",
+    "Miscellaneous***",
+    "Cash contributions",
+    "Personal insurance and pensions",
+    # Specific to food...
+    "Food at home", 
+    "Food away from home", 
+    "Cereals and bakery products", 
+    "Meats, poultry, fish, and eggs",
+    "Dairy products",
+    "Fruits and vegetables",
+    "Other food at home"
+]
+
+# How extract reads the workbook, cached frames are only reused when these (and the workbook) match...
+READ_PARAMS = {"header": 2, "index_col": 0}
+
+# One workbook per survey release, every one matching this in the directory is read when none are given...
+RELEASE_GLOB = "cu-all-multi-year-*.xlsx"
+
+# Bump when what extract returns changes, so frames cached by older versions aren't reused...
+CACHE_VERSION = 2
+CACHE_PARAMS = {**READ_PARAMS, "rows": EX_COLS, "version": CACHE_VERSION}
+
+OUT_NAMES = ["food_spending_long.csv", "food_spending.csv"]
+
+# Cache key of each release read (sheet_cache.cache_key) as of the last run, plus the hash of this script and
+# sheet_cache.py, so editing either rebuilds the outputs. Nothing is read while they all match...
+MANIFEST_NAME = ".extract_manifest.json"
+
+
+def script_hash() -> str:
+    return hashlib.sha1(Path(__file__).read_bytes() + Path(sheet_cache.__file__).read_bytes()).hexdigest()
+
+
+def select_rows(df: pd.DataFrame, rows: list[str] = EX_COLS, name: str = "workbook") -> pd.DataFrame:
+    # Every row in one reindex, giving a year x item frame. The sheet repeats a few labels (blank spacer rows, the
+    # income rows of each section), the first of each is the one used...
+    missing = [row for row in rows if(row not in df.index)]
+    if(len(missing) > 0):
+        raise ValueError(f"{name} is missing rows: {missing}")
+
+    df = df[~df.index.duplicated()].reindex(rows)
+    # The year columns are read as objects (the sheet has text in them), the kept rows are all numbers...
+    final_df = df.T.infer_objects()
+    final_df.index = final_df.index.astype(int).rename("Year")
+    final_df.columns.name = None
+
+    return final_df
+
+
+def extract(path: Path) -> pd.DataFrame:
+    import pandas as pd
+
+    return select_rows(pd.read_excel(str(path), **READ_PARAMS), name=path.name)
+
+
+def extract_all(paths: list[Path], cache_dir: Path = None) -> list[pd.DataFrame]:
+    # Same as merge_sheets.read_sheets: cached workbooks are loaded here, the rest are each read in their own
+    # process, so only the kept rows of each release ever leave its worker...
+    frames = [None] * len(paths)
+    keys = [None] * len(paths)
+
+    if(cache_dir is not None):
+        for i, path in enumerate(paths):
+            keys[i] = sheet_cache.cache_key(path, CACHE_PARAMS)
+            frames[i] = sheet_cache.load_frame(sheet_cache.cache_file(cache_dir, path, "extract"), keys[i])
+
+    todo = [i for i, frame in enumerate(frames) if(frame is None)]
+
+    if(len(todo) == 1):
+        frames[todo[0]] = extract(paths[todo[0]])
+    elif(len(todo) > 1):
+        with ProcessPoolExecutor() as pool:
+            for i, frame in zip(todo, pool.map(extract, [paths[i] for i in todo])):
+                frames[i] = frame
+
+    if(cache_dir is not None):
+        for i in todo:
+            sheet_cache.save_frame(sheet_cache.cache_file(cache_dir, paths[i], "extract"), frames[i], keys[i])
+
+    return frames
+
+
+def to_long(frames: list[pd.DataFrame], names: list[str]) -> pd.DataFrame:
+    # One (Year, Item, Value, Release) row per value. Releases overlap, a year in several of them is taken whole from
+    # the newest (the one reaching the latest year), since later releases revise earlier years. Years are picked
+    # while still wide, then everything is stacked at once...
+    import numpy as np
+    import pandas as pd
+
+    wide = pd.concat(frames, keys=names, names=["Release", "Year"])
+    releases = wide.index.get_level_values("Release")
+
+    newest = pd.Series({name: frame.index.max() for frame, name in zip(frames, names)})
+    wide = wide.iloc[np.lexsort([releases, newest[releases].to_numpy()])]
+    wide = wide[~wide.index.get_level_values("Year").duplicated(keep="last")]
+
+    long = wide.rename_axis(columns="Item").stack().rename("Value").reset_index()
+    long["Item"] = pd.Categorical(long["Item"], categories=EX_COLS)
+    return long.sort_values(["Year", "Item"], ignore_index=True)[["Year", "Item", "Value", "Release"]]
+
+
+def to_wide(long: pd.DataFrame) -> pd.DataFrame:
+    # The year x item table the page reads...
+    wide = long.pivot(index="Year", columns="Item", values="Value")
+    wide.columns = wide.columns.astype(str)
+    wide.columns.name = None
+    return wide[EX_COLS]
+
 
 def main(args):
     this_dir = Path(args[0]).parent
-    
-    df = pd.read_excel(str(list(this_dir.glob("*.xlsx"))[0]), header=2, index_col=0)
-    
-    ex_cols = [
-        # The total...
-        "Average annual expenditures", 
-        # General categories...
-        "Food",
-        "Housing",
-        "Apparel and services",
-        "Transportation",
-        "Healthcare",
-        "Entertainment",
-        "Personal care products and services",
-        "Reading",
-        "Education***",
-        "Tobacco products and smoking supplies",
-        "Miscellaneous***",
-        "Cash contributions",
-        "Personal insurance and pensions",
-        # Specific to food...
-        "Food at home", 
-        "Food away from home", 
-        "Cereals and bakery products", 
-        "Meats, poultry, fish, and eggs",
-        "Dairy products",
-        "Fruits and vegetables",
-        "Other food at home"
-    ]
-    
-    cols = [df.loc[col] for col in ex_cols]
-    
-    final_df = pd.DataFrame(cols, columns=df.columns, index=ex_cols).T
-    final_df.index = final_df.index.rename("Year")
-    
-    final_df.to_csv(this_dir / "food_spending.csv")
-    
-    
-    
+
+    parser = argparse.ArgumentParser(description="Extract the food spending table from the expenditure workbooks.")
+    parser.add_argument(
+        "workbooks", nargs="*", help=f"Releases to read (default: every {RELEASE_GLOB} in this directory)"
+    )
+    parser.add_argument("--force", action="store_true", help="Extract even if the outputs are up to date")
+    opts = parser.parse_args(args[1:])
+
+    paths = [Path(p) for p in opts.workbooks] if(len(opts.workbooks) > 0) else sorted(this_dir.glob(RELEASE_GLOB))
+    if(len(paths) == 0):
+        raise FileNotFoundError(f"No workbooks matching {RELEASE_GLOB} in {this_dir}")
+
+    manifest_file = this_dir / MANIFEST_NAME
+    long_file, wide_file = [this_dir / name for name in OUT_NAMES]
+
+    manifest = {}
+    if(manifest_file.exists() and long_file.exists() and wide_file.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    keys = {p.name: sheet_cache.cache_key(p, CACHE_PARAMS) for p in paths}
+    keys["script_sha1"] = script_hash()
+    if(not opts.force and manifest == keys):
+        print("Food spending up to date.")
+        return
+
+    cache_dir = this_dir / sheet_cache.CACHE_DIR
+    cache_dir.mkdir(exist_ok=True)
+
+    long = to_long(extract_all(paths, cache_dir), [p.name for p in paths])
+    long.to_csv(long_file, index=False)
+    to_wide(long).to_csv(wide_file)
+
+    with open(manifest_file, "w") as f:
+        json.dump(keys, f, indent=4)
+
+    print(f"Wrote {len(long)} values, {long['Year'].nunique()} years from {len(paths)} releases")
+
+
 if(__name__ == "__main__"):
     main(sys.argv)
-
@@ -1,55 +1,168 @@
-import pandas as pd
+from __future__ import annotations
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import numpy as np
+import argparse
+import hashlib
+import json
+import sheet_cache
+
+# The sheets have a 4 row header, the last row holds the column names...
+HEADER = [0, 1, 2, 3]
+
+# Engine passed to pandas for reading workbooks, None lets pandas pick (openpyxl for .xlsx, xlrd for .xls)...
+ENGINE = None
+
+# Bump when the columns kept or how they're cleaned changes, so frames cached by older versions aren't reused...
+CACHE_VERSION = 1
+CACHE_PARAMS = {"header": HEADER, "version": CACHE_VERSION}
+
+OUT_NAME = "residential_consumption.csv"
+
+# Cache key of each workbook (sheet_cache.cache_key) as of the last merge, along with the hash of this script and
+# sheet_cache.py. Nothing is read while they all match...
+MANIFEST_NAME = ".merge_manifest.json"
+
+
+def script_hash() -> str:
+    return hashlib.sha1(Path(__file__).read_bytes() + Path(sheet_cache.__file__).read_bytes()).hexdigest()
+
+
+def stripped(column: tuple) -> tuple:
+    return tuple(i.strip() for i in column)
+
+
+def is_characteristic(column: tuple) -> bool:
+    # Includes dates, locations, keep
+    return ("Utility Characteristics" in column or "Utility Charateristics" in column)
+
+
+def is_consumption(column: tuple) -> bool:
+    # The only column we want, resedential consumption...
+    return all((item in column) for item in ["All Technologies", "Customers"])
+
+
+def keep_columns(columns) -> list:
+    return [
+        column for column in columns
+        if(is_characteristic(stripped(column)) or is_consumption(stripped(column)))
+    ]
+
+
+def clean_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    # Take only the columns we use in one selection (rather than deleting the rest one at a time), and flatten the
+    # 4 level header down to its last level...
+    import pandas as pd
+
+    kept = keep_columns(df.columns)
+    consumption = [is_consumption(stripped(column)) for column in kept]
+
+    df = df[kept]
+    df.columns = [a[-1].strip() for a in kept]
+
+    # Empty entries are a ".", clear them out to 0 and make the column numeric, so every sheet ends up with the same
+    # dtypes and concatenating them doesn't fall back to object columns...
+    for i, numeric in enumerate(consumption):
+        if(numeric):
+            values = df.iloc[:, i]
+            df.isetitem(i, pd.to_numeric(values.where(values != ".", 0)))
+
+    return df
+
+
+def read_sheet(path: Path, engine: str = ENGINE) -> pd.DataFrame:
+    # Resolve the header on its own first (pandas fills in merged header cells, so the kept columns can only be told
+    # apart once all 4 levels are known), then read the body with just the kept columns. The workbook is only opened
+    # once for both...
+    import pandas as pd
+
+    with pd.ExcelFile(path, engine=engine) as xl:
+        columns = xl.parse(header=HEADER, nrows=0).columns
+        kept = set(keep_columns(columns))
+        positions = [i for i, column in enumerate(columns) if(column in kept)]
+
+        df = xl.parse(header=None, skiprows=len(HEADER), usecols=positions)
+
+    df.columns = pd.MultiIndex.from_tuples([columns[i] for i in positions])
+    return clean_sheet(df)
+
+
+def read_sheets(paths: list[Path], engine: str = ENGINE, cache_dir: Path = None) -> list[pd.DataFrame]:
+    # Excel parsing is pure python and by far the slowest step, so each workbook is parsed in its own process, and
+    # with a cache_dir only workbooks that changed since their last read are parsed at all...
+    datasets = [None] * len(paths)
+    keys = [None] * len(paths)
+
+    if(cache_dir is not None):
+        for i, path in enumerate(paths):
+            keys[i] = sheet_cache.cache_key(path, CACHE_PARAMS)
+            datasets[i] = sheet_cache.load_frame(sheet_cache.cache_file(cache_dir, path, "merge"), keys[i])
+
+    todo = [i for i, data in enumerate(datasets) if(data is None)]
+
+    with ProcessPoolExecutor() as pool:
+        for i, data in zip(todo, pool.map(read_sheet, [paths[i] for i in todo], [engine] * len(todo))):
+            datasets[i] = data
+            if(cache_dir is not None):
+                sheet_cache.save_frame(sheet_cache.cache_file(cache_dir, paths[i], "merge"), data, keys[i])
+
+    return datasets
+
+
+def merge(datasets: list[pd.DataFrame]) -> pd.DataFrame:
+    # One concatenation at the end, appending sheet by sheet copies everything merged so far each time...
+    import pandas as pd
+
+    return pd.concat(datasets, ignore_index=True)
+
 
 def main(args):
+    parser = argparse.ArgumentParser(description="Merge the EIA workbooks in this directory.")
+    parser.add_argument("--force", action="store_true", help="Merge even if the output is up to date")
+    opts = parser.parse_args(args[1:])
+
     print("Converting all xlsx files in this directory...")
-    
+
     this_dir = Path(args[0]).parent
-    
-    datasets = []
-    
-    for path in [*this_dir.glob("*.xlsx"), *this_dir.glob("*.xls")]:
-        # Read in the spreadsheet...
-        df = pd.read_excel(str(path), header=[0, 1, 2, 3])
-        
-        print(f"Converting: {path}")
-        
-        # Delete a bunch of features we don't use...
-        for column in df:
-            column = tuple(i.strip() for i in column)
-            # Includes dates, locations, keep
-            if("Utility Characteristics" in column or "Utility Charateristics" in column):
-                print(column)
-                continue
-            # The only column we want, resedential consumption...
-            if(all((item in column) for item in ["All Technologies", "Customers"])):
-                df.loc[df[column] == ".", column] = 0 # Clear out empty entries...
-                print(column)
-                continue
-            
-            del df[column]
-        
-        # Append to datasets...
-        datasets.append(df)
-        
+    paths = [*this_dir.glob("*.xlsx"), *this_dir.glob("*.xls")]
+    if(len(paths) == 0):
+        print("No workbooks found.")
+        return
+
+    out_file = this_dir / OUT_NAME
+    manifest_file = this_dir / MANIFEST_NAME
+
+    manifest = {}
+    if(manifest_file.exists() and out_file.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    keys = {path.name: sheet_cache.cache_key(path, CACHE_PARAMS) for path in paths}
+    keys["script_sha1"] = script_hash()
+    if(not opts.force and manifest == keys):
+        print(f"{OUT_NAME} up to date.")
+        return
+
+    cache_dir = this_dir / sheet_cache.CACHE_DIR
+    cache_dir.mkdir(exist_ok=True)
+
+    datasets = read_sheets(paths, cache_dir=cache_dir)
+
+    for path, data in zip(paths, datasets):
+        print(f"Converted: {path}")
+        print(list(data.columns))
+
     print("Merging Datasets")
-    
-    for data in datasets:
-        data.columns = [a[-1].strip() for a in data]
-        print(data)
-
-        
-    all_data = datasets[0]
-    
-    for data in datasets[1:]:
-        all_data = all_data.append(data, ignore_index=True)
-    
+    all_data = merge(datasets)
+    print(all_data)
+
     print("Saving...")
-    all_data.to_csv(str(this_dir / "residential_consumption.csv"), index=False)
+    all_data.to_csv(str(out_file), index=False)
+
+    with open(manifest_file, "w") as f:
+        json.dump(keys, f, indent=4)
     print("Done!")
-        
-    
+
+
 if(__name__ == "__main__"):
     main(sys.argv)
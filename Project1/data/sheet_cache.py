@@ -0,0 +1,91 @@
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+
+# Frames extracted from workbooks are kept here, one .npz per workbook and script, so reruns only parse the workbooks
+# which changed...
+CACHE_DIR = ".sheet_cache"
+
+
+def cache_key(path: Path, params: dict) -> str:
+    # Changes when either the workbook or how it's extracted (passed in as params) changes...
+    return hashlib.sha1(path.read_bytes() + json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def cache_file(cache_dir: Path, path: Path, name: str) -> Path:
+    return cache_dir / f"{path.name}.{name}.npz"
+
+
+def save_frame(file: Path, df: pd.DataFrame, key: str):
+    # Each column is stored as its own array. Text columns become fixed width unicode arrays with a mask of the
+    # missing entries, so nothing needs pickling. A non default index is stored as the first column, along with its
+    # name (as json, since it can be None)...
+    import numpy as np
+    import pandas as pd
+
+    has_index = not isinstance(df.index, pd.RangeIndex)
+    index_name = df.index.name
+    if(has_index):
+        df = df.reset_index()
+
+    arrays = {}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if(pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values)):
+            arrays[f"column_{i}"] = values.to_numpy()
+        else:
+            missing = values.isna().to_numpy()
+            arrays[f"column_{i}"] = values.where(~missing, "").to_numpy(dtype=str)
+            arrays[f"missing_{i}"] = missing
+
+    np.savez(
+        file,
+        key=key,
+        columns=np.array([str(column) for column in df.columns]),
+        has_index=has_index,
+        index_name=json.dumps(index_name),
+        **arrays
+    )
+
+
+def load_frame(file: Path, key: str) -> pd.DataFrame:
+    # The frame stored by save_frame, or None if there isn't one for this key...
+    import numpy as np
+    import pandas as pd
+
+    if(not file.exists()):
+        return None
+
+    with np.load(file) as cached:
+        if(str(cached["key"]) != key):
+            return None
+
+        data = {}
+        for i, column in enumerate(cached["columns"]):
+            values = cached[f"column_{i}"]
+            if(f"missing_{i}" in cached):
+                values = values.astype(object)
+                values[cached[f"missing_{i}"]] = None
+            data[str(column)] = values
+
+        df = pd.DataFrame(data)
+        if(bool(cached["has_index"])):
+            df = df.set_index(df.columns[0])
+            df.index.name = json.loads(str(cached["index_name"]))
+
+    return df
+
+
+def cached(path: Path, name: str, params: dict, read, cache_dir: Path) -> pd.DataFrame:
+    # read(path) through the cache...
+    file = cache_file(cache_dir, path, name)
+    key = cache_key(path, params)
+
+    df = load_frame(file, key)
+    if(df is None):
+        print(f"Reading: {path}")
+        df = read(path)
+        save_frame(file, df, key)
+
+    return df
@@ -544,6 +544,9 @@ function prepArgs(dataList, xAttr, yAttr, attrs) {
 }
 
 let FILTER_THRESHOLD = 0.1;
+// Grid sizes the grid size slider picks from, data/conv.py precomputes the coarser ones into the *.bins.json files
+// (the rest are binned here, see loadBins)...
+let BIN_SIZES = [8, 10, 12, 15, 20, 25, 30, 40, 50, 60, 70];
 let DEF_INDEXES = {
     "x": "x",
     "y": "y",
@@ -595,6 +598,134 @@ function toBins(data, binSize, indexes = DEF_INDEXES, videoDim = VIDEO_SIZE) {
     }
 }
 
+function fromGrid(grid, binSize, part = "Nose", videoDim = VIDEO_SIZE) {
+    // Expand a grid precomputed by data/conv.py into the same structure toBins returns...
+    let binWidth = Math.ceil(videoDim.width / binSize);
+    let binHeight = Math.ceil(videoDim.height / binSize);
+    let counts = grid.parts[part][binSize];
+    let bins = new Array(binWidth * binHeight);
+
+    for(let x = 0; x < binWidth; x++) {
+        for(let y = 0; y < binHeight; y++) {
+            bins[x * binHeight + y] = {
+                "count": counts[x * binHeight + y],
+                "video_x": x * binSize,
+                "video_y": y * binSize
+            };
+        }
+    }
+
+    return {
+        width: binWidth,
+        height: binHeight,
+        binSize: binSize,
+        bins: bins
+    }
+}
+
+function loadColumns(name) {
+    // Load the float32 columns written by data/conv.py, each column is a view into the one buffer...
+    return Promise.all([
+        d3.json("data/" + name + ".f32.json"), d3.buffer("data/" + name + ".f32")
+    ]).then(([header, buffer]) => {
+        let columns = {};
+
+        header.columns.forEach((column, i) => {
+            columns[column] = new Float32Array(buffer, i * header.rows * Float32Array.BYTES_PER_ELEMENT, header.rows);
+        });
+
+        return {
+            rows: header.rows,
+            columns: columns
+        };
+    });
+}
+
+function columnsToRows(data) {
+    return d3.range(data.rows).map((i) => {
+        let row = {};
+        for(let column in data.columns) {
+            row[column] = data.columns[column][i];
+        }
+        return row;
+    });
+}
+
+function loadBins(name, binSize) {
+    // Use the precomputed grid when there is one for this size, otherwise bin the raw tracking data (from the
+    // binary columns, or the csv if those weren't generated)...
+    return d3.json("data/" + name + ".bins.json").then((grid) => {
+        if(grid.parts.Nose[binSize] !== undefined) {
+            return fromGrid(grid, binSize, "Nose");
+        }
+
+        return loadColumns(name)
+            .then(columnsToRows, () => d3.csv("data/" + name + ".cleancsv"))
+            .then((data) => toBins(data, binSize, {"x": "Nose_x", "y": "Nose_y", "likelihood": "Nose_likelihood"}));
+    });
+}
+
+function loadTrace(name) {
+    // Index of the downsampled traces written by data/downsample.py, the points in each level of each body part. The
+    // levels themselves are separate files, fetched by loadLevel...
+    return d3.json("data/" + name + ".trace.json").then((index) => ({name: name, ...index}));
+}
+
+let traceLevels = new Map();
+
+function loadLevel(trace, part, level) {
+    // Segments of one level, each file is only downloaded once however often the plots are redrawn...
+    let url = "data/" + trace.name + ".trace." + part + "." + level + ".json";
+    if(!traceLevels.has(url)) {
+        traceLevels.set(url, d3.json(url));
+    }
+    return traceLevels.get(url);
+}
+
+function pickLevel(levels, points) {
+    // Name of the smallest level with at least the given number of points, or the full trace if none have enough...
+    let names = Object.keys(levels).filter((d) => d !== "full").sort((a, b) => levels[a] - levels[b]);
+    let name = names.find((d) => levels[d] >= points);
+    return (name === undefined)? "full": name;
+}
+
+function drawUnderlay(plot, name, trace, opacity) {
+    if(trace === null) {
+        plot.plotArea
+            .append("image")
+            .attr("href", "imgs/" + name + "Trace.png")
+            .attr("x", plot.xProj(0))
+            .attr("y", plot.yProj(0))
+            .attr("width", plot.xProj(VIDEO_SIZE.width))
+            .attr("height", plot.yProj(VIDEO_SIZE.height))
+            .attr("image-rendering", "optimizeSpeed")
+            .attr("preserveAspectRatio", "none")
+            .attr("opacity", opacity);
+        return;
+    }
+
+    // Aim for about one point per device pixel across the video as currently shown...
+    let scale = plot.svg.node().getBoundingClientRect().width / WIDTH;
+    let pixels = (plot.xProj(VIDEO_SIZE.width) - plot.xProj(0)) * scale * (window.devicePixelRatio || 1);
+
+    let line = d3.line().x((d) => plot.xProj(d[0])).y((d) => plot.yProj(d[1]));
+    // Added now so the trace stays under the bins, even though its level arrives later...
+    let underlay = plot.plotArea.append("g");
+
+    loadLevel(trace, "Nose", pickLevel(trace.parts.Nose, pixels)).then((level) => {
+        underlay
+            .selectAll("traces")
+            .data(level.map((segment) => d3.range(0, segment.length, 2).map((i) => [segment[i], segment[i + 1]])))
+            .enter()
+            .append("path")
+            .attr("d", line)
+            .attr("fill", "none")
+            .attr("stroke", "black")
+            .attr("stroke-width", 1)
+            .attr("opacity", opacity);
+    });
+}
+
 function setupHover(selector, rects) {
     let tooltip = d3.select(selector);
 
@@ -638,15 +769,16 @@ function updatePlots(
     colorSegments,
     colormapFunc = transformColormapFunc(d3.interpolateCubehelixDefault, d3.scaleLinear().domain([0, 1]).range([0.3, 1])),
     overlayOpacity = 0.5,
-    underlayOpacity = 0.5
+    underlayOpacity = 0.5,
+    vectorTrace = false
 ) {
+    let noTrace = Promise.resolve(null);
+
     Promise.all([
-        d3.csv("data/" + data_name + "control.cleancsv"), d3.csv("data/" + data_name + "so.cleancsv")
+        loadBins(data_name + "control", binSize), loadBins(data_name + "so", binSize),
+        vectorTrace? loadTrace(data_name + "control"): noTrace, vectorTrace? loadTrace(data_name + "so"): noTrace
     ]).then((data) => {
-        let [control, so] = data;
-
-        control = toBins(control, binSize, {"x": "Nose_x", "y": "Nose_y", "likelihood": "Nose_likelihood"});
-        so = toBins(so, binSize, {"x": "Nose_x", "y": "Nose_y", "likelihood": "Nose_likelihood"});
+        let [control, so, controlTrace, soTrace] = data;
 
         let colors = d3.range(colorSegments).map((d) => colormapFunc(d / colorSegments));
         let controlColorMapper = buildMapper(control.bins, "count", colors);
@@ -675,16 +807,7 @@ function updatePlots(
             yAttr: "y",
         });
 
-        controlPlot.plotArea
-            .append("image")
-            .attr("href", "imgs/" + data_name + "controlTrace.png")
-            .attr("x", controlPlot.xProj(0))
-            .attr("y", controlPlot.yProj(0))
-            .attr("width", controlPlot.xProj(VIDEO_SIZE.width))
-            .attr("height", controlPlot.yProj(VIDEO_SIZE.height))
-            .attr("image-rendering", "optimizeSpeed")
-            .attr("preserveAspectRatio", "none")
-            .attr("opacity", underlayOpacity);
+        drawUnderlay(controlPlot, data_name + "control", controlTrace, underlayOpacity);
 
         // Plot the bins!
         let controlRects = controlPlot.plotArea
@@ -731,16 +854,7 @@ function updatePlots(
             yAttr: "y"
         });
 
-        soPlot.plotArea
-            .append("image")
-            .attr("href", "imgs/" + data_name + "soTrace.png")
-            .attr("x", controlPlot.xProj(0))
-            .attr("y", controlPlot.yProj(0))
-            .attr("width", controlPlot.xProj(VIDEO_SIZE.width))
-            .attr("height", controlPlot.yProj(VIDEO_SIZE.height))
-            .attr("image-rendering", "optimizeSpeed")
-            .attr("preserveAspectRatio", "none")
-            .attr("opacity", underlayOpacity);
+        drawUnderlay(soPlot, data_name + "so", soTrace, underlayOpacity);
 
         // Plot the bins!
         let soRects = soPlot.plotArea
@@ -770,13 +884,14 @@ function updatePlots(
 }
 
 function onSettingChange(evt) {
-    let binSize = d3.select("#bucket_size").node().value;
+    let binSize = BIN_SIZES[d3.select("#bucket_size").node().value];
     let ratExp = d3.select("#rat_select").node().value;
     let colorCount = d3.select("#num_colors").node().value;
     let colormap = d3.select("#colormap_select").node().value;
     let reverseCmap = d3.select("#reverse_colormap").node().checked;
     let bo = d3.select("#background_op").node().value;
     let ho = d3.select("#heatmap_op").node().value;
+    let vectorTrace = d3.select("#vector_trace").node().checked;
 
     let rangeArr = reverseCmap? [1, 0]: [0, 1];
 
@@ -789,7 +904,8 @@ function onSettingChange(evt) {
         colorCount,
         transformColormapFunc(d3["interpolate" + colormap], d3.scaleLinear().domain([0, 1]).range(rangeArr)),
         ho,
-        bo
+        bo,
+        vectorTrace
     );
 }
 
@@ -813,12 +929,16 @@ function makePlots() {
         .text((d) => d);
 
     d3.select("#colormap_select").on("input", onSettingChange);
-    d3.select("#bucket_size").on("input", sliderEvt("#bucket_size"));
+    d3.select("#bucket_size").attr("max", BIN_SIZES.length - 1).on("input", (evt) => {
+        d3.select("#bucket_size_val").text(BIN_SIZES[d3.select("#bucket_size").node().value]);
+        onSettingChange(evt);
+    });
     d3.select("#rat_select").on("input", onSettingChange);
     d3.select("#num_colors").on("input", sliderEvt("#num_colors"));
     d3.select("#reverse_colormap").on("input", onSettingChange);
     d3.select("#background_op").on("input", sliderEvt("#background_op"));
     d3.select("#heatmap_op").on("input", sliderEvt("#heatmap_op"));
+    d3.select("#vector_trace").on("input", onSettingChange);
 
     d3.select("#extra_options").on("input", (evt) => {
         d3.selectAll(".hidden_control").style("display", (evt.target.checked)? "block": "none");
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import conv
+import subprocess
+import sys
+import time
+
+# Rows generated at a time when writing synthetic sessions, so long sessions never sit in memory...
+WRITE_CHUNK = 100_000
+
+
+def make_session(path: Path, rows: int, bodyparts: list[str], rng: np.random.Generator):
+    # Synthetic DeepLabCut output, same 3 row header layout as the real tracking files...
+    scorer = "DeepCut_resnet50_Synthetic_250000"
+    header = [
+        ",".join(["scorer"] + [scorer] * (3 * len(bodyparts))),
+        ",".join(["bodyparts"] + [part for part in bodyparts for i in range(3)]),
+        ",".join(["coords"] + ["x", "y", "likelihood"] * len(bodyparts)),
+    ]
+
+    with open(path, "w") as f:
+        f.write("\n".join(header) + "\n")
+
+        for start in range(0, rows, WRITE_CHUNK):
+            values = rng.random((min(WRITE_CHUNK, rows - start), 3 * len(bodyparts)))
+            values[:, 0::3] *= 640
+            values[:, 1::3] *= 480
+            pd.DataFrame(values, index=range(start, start + len(values))).to_csv(f, header=False)
+
+
+def run(label: str, func, files: list[Path]):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+
+    size = sum(p.stat().st_size for p in files) / 2 ** 20
+    print(f"{label:<12} {elapsed:8.2f}s {len(files) / elapsed:10.1f} files/s {size / elapsed:8.1f} MB/s")
+
+
+def compare_formats(files: list[Path], repeats: int = 5):
+    # Size on disk and time to get every value into memory, for each output format of the converted files...
+    def best(func):
+        times = []
+        for i in range(repeats):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    loaders = {
+        "cleancsv": (conv.clean_path, lambda: [pd.read_csv(conv.clean_path(p)).to_numpy() for p in files]),
+        "f32 memmap": (conv.binary_path, lambda: [np.array(list(conv.load_binary(p).values())) for p in files]),
+    }
+
+    for name, (path, load) in loaders.items():
+        size = sum(path(p).stat().st_size for p in files) / 2 ** 20
+        print(f"{name:<12} {size:8.2f} MB {best(load) * 1000:10.2f} ms to load")
+
+
+def peak_rss(call: str, path: Path) -> tuple[float, float]:
+    # Run one conversion in a fresh interpreter, returning its wall time and peak RSS in MB (ru_maxrss is in KB on
+    # Linux)...
+    script = (
+        "import resource, sys, time; from pathlib import Path; import conv; "
+        f"start = time.perf_counter(); conv.{call}(Path(sys.argv[1])); "
+        "print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script, str(path)],
+        cwd=Path(conv.__file__).parent, capture_output=True, text=True, check=True
+    )
+    elapsed, rss = result.stdout.split()
+    return float(elapsed), float(rss)
+
+
+def compare_memory(rows: int):
+    # Peak memory of whole file vs chunked conversion on one long session...
+    with TemporaryDirectory() as tmp:
+        path = Path(tmp) / "long_session.csv"
+        make_session(path, rows, ["Nose", "Tail"], np.random.default_rng(0))
+        size = path.stat().st_size / 2 ** 20
+
+        print(f"Long session, {rows} rows ({size:.1f} MB):")
+        for label, call in [("in memory", "convert"), ("streaming", "convert_streaming")]:
+            elapsed, rss = peak_rss(call, path)
+            print(f"{label:<12} {elapsed:8.2f}s {rss:10.1f} MB peak RSS")
+
+
+def main(args):
+    # usage: bench_conv.py [SESSIONS] [ROWS_PER_SESSION] [LONG_SESSION_ROWS]
+    sessions = int(args[1]) if(len(args) > 1) else 200
+    rows = int(args[2]) if(len(args) > 2) else 2800
+    long_rows = int(args[3]) if(len(args) > 3) else 2_000_000
+    rng = np.random.default_rng(0)
+
+    with TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        script = tmp / "conv.py"
+
+        for i in range(sessions):
+            make_session(tmp / f"rat{i}so.csv", rows, ["Nose", "Tail"], rng)
+        files = sorted(tmp.glob("*.csv"))
+
+        print(f"{sessions} sessions of {rows} rows:")
+        run("serial", lambda: [conv.convert(p) for p in files], files)
+
+        def pool():
+            with ProcessPoolExecutor() as pool:
+                list(pool.map(conv.convert, files))
+
+        run("pool", pool, files)
+
+        # Full script run, then a rerun that should find nothing to do...
+        for p in tmp.glob("*.cleancsv"):
+            p.unlink()
+        run("main", lambda: conv.main([str(script)]), files)
+        run("main (noop)", lambda: conv.main([str(script)]), files)
+
+        print("Output formats:")
+        compare_formats(files)
+
+    if(long_rows > 0):
+        compare_memory(long_rows)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -1,21 +1,306 @@
-import numpy as np
-import pandas as pd
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+import argparse
+import contextlib
+import csv
+import hashlib
+import json
+import math
+import shutil
 import sys
+import tempfile
+import time
+
+# Records the hash of each source csv as of its last conversion, so files whose timestamps changed (say from a fresh
+# checkout) but whose content didn't aren't converted again. Also holds the hash of this script, every file is
+# converted again when it changes...
+MANIFEST_NAME = ".conv_manifest.json"
+
+# Grid sizes (in pixels) of the heatmaps on the page, charts.js has a matching BIN_SIZES list...
+BIN_SIZES = [8, 10, 12, 15, 20, 25, 30, 40, 50, 60, 70]
+# Grids precomputed into the *.bins.json files: only the body parts the page draws, at the coarser sizes, which keeps
+# each file to a few KB. The page bins anything else itself from the .f32 columns...
+GRID_PARTS = ["Nose"]
+GRID_SIZES = [20, 25, 30, 40, 50, 60, 70]
+# Frames tracked with a likelihood below this are left out of the grids, same as FILTER_THRESHOLD in charts.js...
+FILTER_THRESHOLD = 0.1
+VIDEO_SIZE = (640, 480)
+
+# Output formats: "csv" is the flattened .cleancsv, "binary" is one little-endian float32 array per column in a .f32
+# file, described by a small .f32.json header...
+FORMATS = ["csv", "binary"]
+BINARY_DTYPE = "<f4"
+
+# Files bigger than this (in bytes) are converted in chunks of CHUNK_SIZE rows, keeping memory use flat no matter
+# how long the session is...
+STREAM_SIZE = 256 * 2 ** 20
+CHUNK_SIZE = 100_000
+
+
+def clean_path(p: Path) -> Path:
+    return p.parent / (p.stem + ".cleancsv")
+
+
+def bins_path(p: Path) -> Path:
+    return p.parent / (p.stem + ".bins.json")
+
+
+def binary_path(p: Path) -> Path:
+    return p.parent / (p.stem + ".f32")
+
+
+def binary_header_path(p: Path) -> Path:
+    return p.parent / (p.stem + ".f32.json")
+
+
+def outputs(p: Path, formats: list[str] = FORMATS) -> list[Path]:
+    paths = [bins_path(p)]
+    if("csv" in formats):
+        paths.append(clean_path(p))
+    if("binary" in formats):
+        paths += [binary_path(p), binary_header_path(p)]
+    return paths
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def read_header(p: Path) -> list[str]:
+    # DeepLabCut files have 3 header rows (scorer, bodyparts, coords), flatten them to "bodypart_coord"...
+    with open(p, newline="") as f:
+        reader = csv.reader(f)
+        scorer, bodyparts, coords = next(reader), next(reader), next(reader)
+
+    return [f"{part}_{coord}" for part, coord in zip(bodyparts[1:], coords[1:])]
+
+
+def to_bins(
+    x: np.ndarray,
+    y: np.ndarray,
+    likelihood: np.ndarray,
+    bin_size: int,
+    video_size: tuple[int, int] = VIDEO_SIZE,
+    threshold: float = FILTER_THRESHOLD,
+    weighted: bool = False
+) -> np.ndarray:
+    # Occupancy grid flattened x major (index = x * bin_height + y), the same layout as toBins in charts.js. Frames
+    # off the video are dropped, and the rest either count as 1 if their likelihood passes the threshold, or count
+    # as their likelihood when weighted...
+    import numpy as np
+
+    width, height = video_size
+    bin_width = math.ceil(width / bin_size)
+    bin_height = math.ceil(height / bin_size)
+
+    keep = (x >= 0) & (x <= width) & (y >= 0) & (y <= height)
+    if(not weighted):
+        keep &= likelihood >= threshold
+
+    # Points right on the far edge go in the last bin rather than off the grid...
+    x_loc = np.minimum((x[keep] // bin_size).astype(np.int64), bin_width - 1)
+    y_loc = np.minimum((y[keep] // bin_size).astype(np.int64), bin_height - 1)
+
+    return np.bincount(
+        x_loc * bin_height + y_loc,
+        weights=likelihood[keep] if(weighted) else None,
+        minlength=bin_width * bin_height
+    )
+
+
+def add_bins(
+    grids: dict, data: pd.DataFrame, sizes: list[int] = GRID_SIZES, parts: list[str] = GRID_PARTS
+) -> dict:
+    # Grids are plain counts, so a session can be binned a chunk at a time by adding each chunk's counts...
+    parts = [part for part in parts if(f"{part}_x" in data.columns)]
+
+    for part in parts:
+        x, y, likelihood = (data[f"{part}_{coord}"].to_numpy() for coord in ["x", "y", "likelihood"])
+        part_grids = grids.setdefault(part, {})
+        for size in sizes:
+            counts = to_bins(x, y, likelihood, size)
+            part_grids[size] = counts if(size not in part_grids) else part_grids[size] + counts
+
+    return grids
+
+
+def bins_asset(grids: dict, sizes: list[int] = GRID_SIZES) -> dict:
+    return {
+        "video": {"width": VIDEO_SIZE[0], "height": VIDEO_SIZE[1]},
+        "threshold": FILTER_THRESHOLD,
+        "sizes": sizes,
+        "parts": {
+            part: {str(size): counts.tolist() for size, counts in part_grids.items()}
+            for part, part_grids in grids.items()
+        }
+    }
+
+
+def bin_session(data: pd.DataFrame, sizes: list[int] = GRID_SIZES) -> dict:
+    return bins_asset(add_bins({}, data, sizes), sizes)
+
+
+def write_binary_header(p: Path, columns: list[str], rows: int):
+    with open(binary_header_path(p), "w") as f:
+        json.dump({"columns": columns, "rows": rows, "dtype": BINARY_DTYPE}, f)
+
+
+def write_binary(data: pd.DataFrame, p: Path):
+    # Columns are stored one after another, so each can be viewed without copying (a memmap row here, or a
+    # Float32Array over part of the buffer in the browser)...
+    import numpy as np
+
+    values = np.ascontiguousarray(data.to_numpy(dtype=BINARY_DTYPE).T)
+    values.tofile(binary_path(p))
+
+    write_binary_header(p, list(data.columns), len(data))
+
+
+def load_binary(p: Path) -> dict[str, np.ndarray]:
+    # Memory map a file written by write_binary, p is either the source csv or the .f32 file...
+    import numpy as np
+
+    with open(binary_header_path(p)) as f:
+        header = json.load(f)
+
+    values = np.memmap(
+        binary_path(p), dtype=header["dtype"], mode="r", shape=(len(header["columns"]), header["rows"])
+    )
+
+    return dict(zip(header["columns"], values))
+
+
+def convert(p: Path, formats: list[str] = FORMATS) -> Path:
+    # Reading the body with a plain header is much faster than letting pandas build a 3 level MultiIndex...
+    import pandas as pd
+
+    data = pd.read_csv(p, skiprows=3, header=None, index_col=0)
+    data.columns = read_header(p)
+
+    if("csv" in formats):
+        data.to_csv(clean_path(p), index=False)
+    if("binary" in formats):
+        write_binary(data, p)
+
+    with open(bins_path(p), "w") as f:
+        json.dump(bin_session(data), f, separators=(",", ":"))
+
+    return p
+
+
+def convert_streaming(p: Path, formats: list[str] = FORMATS, chunksize: int = CHUNK_SIZE) -> Path:
+    # Same outputs as convert, but only chunksize rows are in memory at once. Binary columns are appended to one
+    # temporary file each, then joined once the row count is known...
+    import pandas as pd
+
+    columns = read_header(p)
+    reader = pd.read_csv(p, skiprows=3, header=None, index_col=0, names=["index", *columns], chunksize=chunksize)
+
+    grids = {}
+    rows = 0
+
+    with tempfile.TemporaryDirectory(dir=p.parent) as tmp, contextlib.ExitStack() as files:
+        csv_out = files.enter_context(open(clean_path(p), "w")) if("csv" in formats) else None
+        column_files = []
+        if("binary" in formats):
+            column_files = [files.enter_context(open(Path(tmp) / f"{i}.f32", "wb")) for i in range(len(columns))]
+
+        for chunk in reader:
+            if(csv_out is not None):
+                chunk.to_csv(csv_out, index=False, header=(rows == 0))
+            if(len(column_files) > 0):
+                values = chunk.to_numpy(dtype=BINARY_DTYPE)
+                for i, f in enumerate(column_files):
+                    values[:, i].tofile(f)
+
+            add_bins(grids, chunk)
+            rows += len(chunk)
+
+        files.close()
+
+        if("binary" in formats):
+            with open(binary_path(p), "wb") as out:
+                for f in column_files:
+                    with open(f.name, "rb") as column:
+                        shutil.copyfileobj(column, out)
+            write_binary_header(p, columns, rows)
+
+    with open(bins_path(p), "w") as f:
+        json.dump(bins_asset(grids), f, separators=(",", ":"))
+
+    return p
+
+
+def needs_update(p: Path, manifest: dict, formats: list[str] = FORMATS) -> bool:
+    paths = outputs(p, formats)
+
+    if(p.name not in manifest or not all(out.exists() for out in paths)):
+        return True
+    if(all(out.stat().st_mtime >= p.stat().st_mtime for out in paths)):
+        return False
+
+    return manifest[p.name] != file_hash(p)
+
 
 def main(args):
+    parser = argparse.ArgumentParser(description="Convert DeepLabCut tracking csvs in this directory.")
+    parser.add_argument(
+        "--format", default=",".join(FORMATS),
+        help=f"Comma separated output formats, any of: {', '.join(FORMATS)} (default: all)"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=None,
+        help=f"Convert every file in chunks of this many rows (default: only files over {STREAM_SIZE // 2 ** 20} MB, "
+        f"in chunks of {CHUNK_SIZE})"
+    )
+    parser.add_argument("--force", action="store_true", help="Convert every file even if it's up to date")
+    opts = parser.parse_args(args[1:])
+    formats = opts.format.split(",")
+    if(not set(formats) <= set(FORMATS)):
+        parser.error(f"Unknown format in: {opts.format}")
+
     this_dir = Path(args[0]).resolve().parent
-    
-    for p in this_dir.glob("*.csv"):
-        new_file = p.parent / (p.stem + ".cleancsv")
-        
-        data = pd.read_csv(p, header=[0, 1, 2], index_col=0)
-        
-        data.columns = [f"{c[1]}_{c[2]}" for c in data.columns]
-        
-        print(new_file)
-        
-        data.to_csv(new_file, index=False)
-        
+    manifest_file = this_dir / MANIFEST_NAME
+
+    manifest = {}
+    if(manifest_file.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    script_hash = file_hash(Path(__file__))
+    if(opts.force or manifest.get("script_sha1") != script_hash):
+        manifest = {"script_sha1": script_hash}
+
+    todo = [p for p in sorted(this_dir.glob("rat*.csv")) if(needs_update(p, manifest, formats))]
+
+    if(len(todo) == 0):
+        print("All files up to date.")
+        return
+
+    start = time.perf_counter()
+
+    streamed = [p for p in todo if(opts.chunksize is not None or p.stat().st_size > STREAM_SIZE)]
+    in_memory = [p for p in todo if(p not in streamed)]
+
+    with ProcessPoolExecutor() as pool:
+        for p in pool.map(partial(convert, formats=formats), in_memory):
+            print(p)
+            manifest[p.name] = file_hash(p)
+
+    # Streamed files are big, so convert them one at a time to keep memory use flat...
+    for p in streamed:
+        print(convert_streaming(p, formats, opts.chunksize or CHUNK_SIZE))
+        manifest[p.name] = file_hash(p)
+
+    elapsed = time.perf_counter() - start
+    size = sum(p.stat().st_size for p in todo) / 2 ** 20
+    print(f"Converted {len(todo)} files in {elapsed:.2f}s ({len(todo) / elapsed:.1f} files/s, {size / elapsed:.1f} MB/s)")
+
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
 if(__name__ == "__main__"):
     main(sys.argv)
@@ -0,0 +1,189 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import conv
+import hashlib
+import json
+import metrics
+import sys
+
+# Point counts of each level of a trace, the page draws the smallest level with enough points for the size the plot is
+# shown at. A session's full trace is always included as the last level, named "full". Every level of every body
+# part is its own file, listed in the session's *.trace.json, so the page only downloads the one it draws...
+LEVELS = [250, 500, 1000, 2000]
+FULL_LEVEL = "full"
+
+# Untracked stretches longer than this many frames break the trace into separate segments, shorter ones are bridged
+# by a straight line...
+MAX_GAP = 15
+
+# Coordinates are rounded to this many decimals in the output, well under a pixel on the page...
+PRECISION = 1
+
+# Hash of each session's data (what metrics.load_session reads of it) as of its last trace, and of the scripts the
+# traces are made with (this one, metrics.py and conv.py, which read the sessions)...
+MANIFEST_NAME = ".trace_manifest.json"
+
+
+def script_hash() -> str:
+    return hashlib.sha1(b"".join(Path(f).read_bytes() for f in [__file__, metrics.__file__, conv.__file__])).hexdigest()
+
+
+def session_hash(p: Path) -> str:
+    return hashlib.sha1(b"".join(f.read_bytes() for f in metrics.session_files(p))).hexdigest()
+
+
+def trace_path(p: Path) -> Path:
+    return p.parent / (p.stem + ".trace.json")
+
+
+def level_path(p: Path, part: str, level: str) -> Path:
+    return p.parent / f"{p.stem}.trace.{part}.{level}.json"
+
+
+def lttb(x: np.ndarray, y: np.ndarray, target: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets, returns the indexes of the target points kept. The first and last points are
+    # always kept, and the rest are split into target - 2 buckets, keeping the point in each bucket which makes the
+    # largest triangle with the point kept from the previous bucket and the average of the next one...
+    import numpy as np
+
+    n = len(x)
+    if(target >= n):
+        return np.arange(n)
+    if(target < 3):
+        return np.array([0, n - 1])
+
+    # Bucket edges over points 1 to n - 2, the spacing is >= 1 so no bucket is empty...
+    edges = np.linspace(1, n - 1, target - 1).astype(np.int64)
+
+    # Averages of every bucket at once from running sums, shifted so avg[j] is the bucket after bucket j, with the
+    # last point standing in after the final bucket...
+    sum_x = np.concatenate([[0], np.cumsum(x, dtype=np.float64)])
+    sum_y = np.concatenate([[0], np.cumsum(y, dtype=np.float64)])
+    counts = edges[1:] - edges[:-1]
+    avg_x = np.append(((sum_x[edges[1:]] - sum_x[edges[:-1]]) / counts)[1:], x[-1])
+    avg_y = np.append(((sum_y[edges[1:]] - sum_y[edges[:-1]]) / counts)[1:], y[-1])
+
+    kept = np.empty(target, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+
+    # Each bucket depends on the point picked in the one before it, so the walk is sequential, but all the triangle
+    # areas in a bucket are computed together...
+    for j in range(target - 2):
+        lo, hi = edges[j], edges[j + 1]
+        area = np.abs((x[a] - avg_x[j]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y[j] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[j + 1] = a
+
+    return kept
+
+
+def segments(valid: np.ndarray, max_gap: int = MAX_GAP) -> list[np.ndarray]:
+    # Frame indexes of each tracked stretch of the session...
+    import numpy as np
+
+    frames = np.flatnonzero(valid)
+    if(len(frames) == 0):
+        return []
+
+    breaks = np.flatnonzero(np.diff(frames) > max_gap) + 1
+    return np.split(frames, breaks)
+
+
+def downsample(
+    x: np.ndarray, y: np.ndarray, valid: np.ndarray, levels: list[int] = LEVELS
+) -> dict[str, tuple[int, list]]:
+    # Returns {level: (points, segments)}. Each level spreads its points over the segments in proportion to their
+    # length, so a level holds about as many points as its name says. Levels with as many points as the full trace are
+    # left out. Segments are flattened to [x0, y0, x1, y1, ...] for the page...
+    import numpy as np
+
+    parts = segments(valid)
+    total = sum(len(frames) for frames in parts)
+    sizes = [level for level in levels if(level < total)]
+
+    result = {}
+    for size in [*sizes, None]:
+        level = []
+        points = 0
+        for frames in parts:
+            kept = frames
+            if(size is not None):
+                kept = frames[lttb(x[frames], y[frames], max(2, round(size * len(frames) / total)))]
+            level.append(np.round(np.column_stack([x[kept], y[kept]]).ravel(), PRECISION).tolist())
+            points += len(kept)
+        result[FULL_LEVEL if(size is None) else str(size)] = (points, level)
+
+    return result
+
+
+def trace_session(p: Path, threshold: float = conv.FILTER_THRESHOLD) -> tuple[dict, dict[Path, list]]:
+    # Returns (index, {level file: segments}), the index lists the points in each level of each part...
+    import numpy as np
+
+    columns = metrics.load_session(p)
+    parts = [c[:-len("_x")] for c in columns if(c.endswith("_x"))]
+
+    index = {"threshold": threshold, "max_gap": MAX_GAP, "parts": {}}
+    files = {}
+    for part in parts:
+        levels = downsample(
+            np.asarray(columns[f"{part}_x"], dtype=np.float64),
+            np.asarray(columns[f"{part}_y"], dtype=np.float64),
+            np.asarray(columns[f"{part}_likelihood"]) >= threshold
+        )
+        index["parts"][part] = {level: points for level, (points, segments) in levels.items()}
+        files.update({level_path(p, part, level): segments for level, (points, segments) in levels.items()})
+
+    return index, files
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Downsample the tracked paths of every session in this directory.")
+    parser.add_argument("--force", action="store_true", help="Trace every session even if it's up to date")
+    opts = parser.parse_args(args[1:])
+
+    this_dir = Path(args[0]).resolve().parent
+    manifest_file = this_dir / MANIFEST_NAME
+
+    manifest = {}
+    if(manifest_file.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    if(opts.force or manifest.get("script_sha1") != script_hash()):
+        manifest = {"script_sha1": script_hash()}
+
+    hashes = {p: session_hash(p) for p in sorted(this_dir.glob("rat*.csv"))}
+    todo = [p for p, h in hashes.items() if(not trace_path(p).exists() or manifest.get(p.name) != h)]
+
+    if(len(todo) == 0):
+        print("All traces up to date.")
+        return
+
+    for p in todo:
+        out = trace_path(p)
+        index, files = trace_session(p)
+
+        # Levels left from an earlier run with other settings...
+        for old in set(p.parent.glob(f"{p.stem}.trace.*.json")) - set(files):
+            old.unlink()
+
+        for path, level in files.items():
+            with open(path, "w") as f:
+                json.dump(level, f, separators=(",", ":"))
+
+        # Written last, so an index is never newer than its levels...
+        with open(out, "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        print(out)
+
+        manifest[p.name] = hashes[p]
+
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import conv
+import hashlib
+import json
+import re
+import sys
+
+# Frame rate of the tracking videos, same as VIDEO_FPS in charts.js...
+VIDEO_FPS = 15
+SESSION_RE = re.compile(r"^rat(?P<rat>\d+)(?P<condition>so|control)$")
+
+# Regions of interest, as circles in video pixels. rois.json holds a "default" list and optionally a list per
+# session (e.g. "rat1so") for when objects were moved between runs...
+ROI_FILE = "rois.json"
+CACHE_DIR = ".metrics_cache"
+
+SUMMARY_NAME = "metrics_summary.csv"
+
+# Cache key of each session (cache_key) as of the last summary, nothing is read while they all match. The keys include
+# the hash of this script and conv.py, so changing how metrics are computed (or read) makes them all stale...
+MANIFEST_NAME = ".metrics_manifest.json"
+
+
+def load_rois(this_dir: Path) -> dict:
+    with open(this_dir / ROI_FILE) as f:
+        return json.load(f)
+
+
+def session_rois(rois: dict, session: str) -> list[dict]:
+    return rois.get(session, rois["default"])
+
+
+def session_files(p: Path) -> list[Path]:
+    # What load_session reads for the session of the source csv p, conv.py's outputs...
+    if(conv.binary_path(p).exists()):
+        return [conv.binary_path(p), conv.binary_header_path(p)]
+    return [conv.clean_path(p)]
+
+
+def load_session(p: Path) -> dict[str, np.ndarray]:
+    # Prefer the float32 columns, they don't need parsing...
+    import pandas as pd
+
+    if(conv.binary_path(p).exists()):
+        return conv.load_binary(p)
+
+    data = pd.read_csv(conv.clean_path(p))
+    return {c: data[c].to_numpy() for c in data.columns}
+
+
+def compute_metrics(columns: dict[str, np.ndarray], rois: list[dict], threshold: float = conv.FILTER_THRESHOLD) -> dict:
+    import numpy as np
+
+    parts = [c[:-len("_x")] for c in columns if(c.endswith("_x"))]
+
+    # Everything below works on (part, frame) arrays, so all body parts go through together...
+    x = np.stack([columns[f"{part}_x"] for part in parts]).astype(np.float64)
+    y = np.stack([columns[f"{part}_y"] for part in parts]).astype(np.float64)
+    valid = np.stack([columns[f"{part}_likelihood"] for part in parts]) >= threshold
+
+    x[~valid] = np.nan
+    y[~valid] = np.nan
+
+    # Distance from each part to each roi center over time, (part, roi, frame)...
+    centers = np.array([[roi["x"], roi["y"]] for roi in rois], dtype=np.float64).reshape(-1, 2)
+    radii = np.array([roi["radius"] for roi in rois], dtype=np.float64)
+    distance = np.hypot(x[:, None, :] - centers[None, :, 0, None], y[:, None, :] - centers[None, :, 1, None])
+
+    # NaN (untracked) frames compare false, so they never count as inside...
+    dwell = (distance <= radii[None, :, None]).sum(axis=2) / VIDEO_FPS
+
+    # Speed between consecutive frames, only where both frames were tracked, in pixels per second...
+    speed = np.hypot(np.diff(x, axis=1), np.diff(y, axis=1)) * VIDEO_FPS
+
+    return {
+        "parts": parts,
+        "rois": [roi["name"] for roi in rois],
+        "frames": x.shape[1],
+        "valid": valid,
+        "distance": distance,
+        "dwell": dwell,
+        "speed": speed
+    }
+
+
+def script_hash() -> str:
+    return hashlib.sha1(Path(__file__).read_bytes() + Path(conv.__file__).read_bytes()).hexdigest()
+
+
+def cache_key(p: Path, rois: list[dict]) -> str:
+    # Over the files the session is actually read from, so metrics follow conv.py's outputs when they're rebuilt...
+    return hashlib.sha1(
+        b"".join(f.read_bytes() for f in session_files(p)) + json.dumps(rois, sort_keys=True).encode()
+        + script_hash().encode()
+    ).hexdigest()
+
+
+def session_metrics(p: Path, rois: list[dict], cache_dir: Path, force: bool = False) -> dict:
+    # Cached per session, and recomputed when the tracking data read, its rois or the scripts change (or always with
+    # force)...
+    import numpy as np
+
+    cache_file = cache_dir / (p.stem + ".npz")
+    key = cache_key(p, rois)
+
+    if(not force and cache_file.exists()):
+        with np.load(cache_file) as cached:
+            if(str(cached["key"]) == key):
+                return {
+                    "parts": list(cached["parts"]),
+                    "rois": list(cached["rois"]),
+                    "frames": int(cached["frames"]),
+                    **{name: cached[name] for name in ["valid", "distance", "dwell", "speed"]}
+                }
+
+    print(f"Computing: {p}")
+    metrics = compute_metrics(load_session(p), rois)
+    np.savez_compressed(cache_file, key=key, **metrics)
+
+    return metrics
+
+
+def summarize(session: str, metrics: dict) -> dict:
+    import numpy as np
+
+    mo = SESSION_RE.match(session)
+    row = {
+        "session": session,
+        "rat": int(mo.group("rat")),
+        "condition": mo.group("condition"),
+        "frames": metrics["frames"],
+        "seconds": metrics["frames"] / VIDEO_FPS
+    }
+
+    for i, part in enumerate(metrics["parts"]):
+        row[f"{part}_tracked"] = metrics["valid"][i].mean()
+        row[f"{part}_mean_speed"] = np.nanmean(metrics["speed"][i])
+        for j, roi in enumerate(metrics["rois"]):
+            row[f"{part}_{roi}_dwell_s"] = metrics["dwell"][i, j]
+
+    if("Nose" in metrics["parts"]):
+        nose = metrics["parts"].index("Nose")
+        for j, roi in enumerate(metrics["rois"]):
+            row[f"Nose_{roi}_mean_distance"] = np.nanmean(metrics["distance"][nose, j])
+
+    return row
+
+
+def write_summary(rows: list[dict], out: Path):
+    import pandas as pd
+
+    summary = pd.DataFrame(rows).sort_values(["rat", "condition"])
+    summary.to_csv(out, index=False)
+    print(summary[["session", "Nose_tracked", "Nose_mean_speed"]])
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Summarize the tracking metrics of every session in this directory.")
+    parser.add_argument("--force", action="store_true", help="Compute every session again, cached or not")
+    opts = parser.parse_args(args[1:])
+
+    this_dir = Path(args[0]).resolve().parent
+    rois = load_rois(this_dir)
+    out = this_dir / SUMMARY_NAME
+    manifest_file = this_dir / MANIFEST_NAME
+
+    sessions = [p for p in sorted(this_dir.glob("rat*.csv")) if(SESSION_RE.match(p.stem) is not None)]
+    keys = {p.name: cache_key(p, session_rois(rois, p.stem)) for p in sessions}
+
+    manifest = {}
+    if(manifest_file.exists() and out.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    if(not opts.force and manifest == keys):
+        print("Metrics up to date.")
+        return
+
+    cache_dir = this_dir / CACHE_DIR
+    cache_dir.mkdir(exist_ok=True)
+
+    rows = []
+
+    for p in sessions:
+        metrics = session_metrics(p, session_rois(rois, p.stem), cache_dir, opts.force)
+        rows.append(summarize(p.stem, metrics))
+
+    write_summary(rows, out)
+
+    with open(manifest_file, "w") as f:
+        json.dump(keys, f, indent=4)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
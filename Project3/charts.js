@@ -34,6 +34,9 @@ let COLORMAPS = [
 
 let numSort = (a, b) => a - b;
 
+// Douglas-Peucker tolerances (in degrees) of the data/coastline_*.json levels written by data/geo_prep.py...
+let COASTLINE_TOLERANCES = [0.01, 0.02, 0.04, 0.08];
+
 let VIEWABLE_ATTRIBUTES = {
     // Pretty name: [table name, domain type, legend title, reversed, is number, filter zero]
     "Polisity": ["Polisity", ordinalDomain(numSort), "Certainty", true, true, false],
@@ -441,12 +444,6 @@ function update(info = {}) {
         filterZero
     ] = VIEWABLE_ATTRIBUTES[colorField];
 
-    if(isNumeric) {
-        for(let row of DATA.polisData) {
-            row[tblName] = (row[tblName] === "")? null: +row[tblName];
-        }
-    }
-
     let rangeArr = reverseCMap? [1, 0]: [0, 1];
     let modCMap = transformColormapFunc(d3["interpolate" + colormap], d3.scaleLinear().domain([0, 1]).range(rangeArr));
     let cList = d3.range(numColors).map((d) => modCMap(d / numColors));
@@ -463,7 +460,11 @@ function update(info = {}) {
         legendPadding: 3,
     });
 
-    addHover("#tooltip", PlotElements[plotName].polis, (d) => "Name: " + d.Name + "<br>" + colorField + ": " + d[tblName]);
+    addMapHover(
+        plotName,
+        (d) => "Name: " + d.Name + "<br>" + colorField + ": " + d[tblName] + "<br>" + regionSummary(d["Region #"]),
+        (d) => d[tblName] != null
+    );
 
     PlotElements[plotName].polis.on("click", (evt, d) => {
         window.open(d["Pleiades link"], '_blank');
@@ -474,6 +475,78 @@ function update(info = {}) {
         .attr("fill", (d) => (d[tblName] != null && !(filterZero && d[tblName] === 0))? finalColorMap(d[tblName]): "transparent");
 }
 
+function nearestPolis(index, x, y, accept = (row) => true) {
+    // Search the implicit k-d tree written by data/polis_index.py for the csv row of the nearest accepted polis. The
+    // node for [lo, hi) is at the middle, splitting on x at even depths and y at odd ones...
+    let best = null;
+    let bestDist = Infinity;
+
+    let search = (lo, hi, depth) => {
+        if(lo >= hi) return;
+
+        let mid = (lo + hi) >> 1;
+        let dist = (index.x[mid] - x) ** 2 + (index.y[mid] - y) ** 2;
+        if(dist < bestDist && accept(index.rows[mid])) {
+            [best, bestDist] = [index.rows[mid], dist];
+        }
+
+        // Nearer side first, and the far side only if the splitting line is closer than the best so far...
+        let diff = (depth % 2 === 0)? x - index.x[mid]: y - index.y[mid];
+        let [near, far] = (diff < 0)? [[lo, mid], [mid + 1, hi]]: [[mid + 1, hi], [lo, mid]];
+        search(near[0], near[1], depth + 1);
+        if(diff * diff < bestDist) search(far[0], far[1], depth + 1);
+    };
+
+    search(0, index.rows.length, 0);
+    return best;
+}
+
+function regionSummary(region) {
+    let summary = DATA.polisIndex.regions[region];
+    return "Region: " + summary.name + " (" + summary.poleis + " poleis, " + summary.staseis + " staseis)";
+}
+
+function addMapHover(plotName, textFunc, accept, radius = 6) {
+    // One handler for the whole map, the polis under the mouse comes from the spatial index rather than from hit
+    // testing every circle...
+    let {plot, polis, projection, project} = PlotElements[plotName];
+    let tooltip = d3.select("#tooltip");
+    let highlighted = null;
+
+    let clear = () => {
+        if(highlighted !== null) highlighted.attr("stroke", "none");
+        highlighted = null;
+        tooltip.style("opacity", 0).style("display", "none");
+    };
+
+    let mousemove = (evt) => {
+        let [mouseX, mouseY] = d3.pointer(evt, plot.plotArea.node());
+        let [lon, lat] = projection.invert([plot.xProj.invert(mouseX), plot.yProj.invert(mouseY)]);
+        let row = nearestPolis(
+            DATA.polisIndex,
+            lon * Math.PI / 180,
+            Math.log(Math.tan(Math.PI / 4 + lat * Math.PI / 360)),
+            (row) => accept(DATA.polisData[row])
+        );
+
+        clear();
+        if(row === null) return;
+
+        let d = DATA.polisData[row];
+        let [x, y] = project([d.Longitude, d.Latitude]);
+        if(Math.hypot(x - mouseX, y - mouseY) > radius) return;
+
+        highlighted = polis.filter((p) => p === d).attr("stroke", "black").attr("stroke-width", "3px");
+        tooltip.html(textFunc(d))
+            .style("opacity", 1)
+            .style("display", "block")
+            .style("left", evt.clientX + "px")
+            .style("top", (evt.clientY - 10) + "px");
+    };
+
+    plot.plotArea.on("mousemove", mousemove).on("mouseleave", clear);
+}
+
 function addLine(plot, dataObj, index = 0, attrs = {}) {
     let {dataList, xAttr, yAttr} = dataObj;
     let {plotArea, xProj, yProj} = plot;
@@ -556,6 +629,68 @@ function addHistogram(plot, dataObj, index = 0, attrs = {}, padding = 5) {
     );
 }
 
+function columnsToRows(dataset) {
+    // Row objects over the typed columns written by data/polis_build.py, values are already numbers (or null) so
+    // nothing is parsed here. Categories stay as their integer codes, see dataset.categories for the values...
+    let rows = d3.range(dataset.rows).map(() => ({}));
+
+    for(let column in dataset.columns) {
+        let values = dataset.columns[column];
+        rows.forEach((row, i) => {
+            row[column] = values[i];
+        });
+    }
+
+    return rows;
+}
+
+function coastlineLevel(scale, pixelsPerUnit = 1.7) {
+    // The coarsest level that's still under half a pixel. A projected unit is 1 / scale radians, and geoPlot stretches
+    // each unit over about pixelsPerUnit pixels...
+    let halfPixel = (180 / Math.PI) / scale / pixelsPerUnit / 2;
+    let level = 0;
+
+    COASTLINE_TOLERANCES.forEach((tolerance, i) => {
+        if(tolerance <= halfPixel) level = i;
+    });
+
+    return level;
+}
+
+function loadCoastline(level) {
+    // Decode the quantized, delta encoded rings back into a GeoJSON FeatureCollection...
+    return d3.json("data/coastline_" + level + ".json").then((coastline) => {
+        let [scaleX, scaleY] = coastline.transform.scale;
+        let [translateX, translateY] = coastline.transform.translate;
+
+        let decodeRing = (ring) => {
+            let points = [];
+            let [x, y] = [0, 0];
+
+            for(let i = 0; i < ring.length; i += 2) {
+                x += ring[i];
+                y += ring[i + 1];
+                points.push([x * scaleX + translateX, y * scaleY + translateY]);
+            }
+            points.push(points[0]);
+
+            return points;
+        };
+
+        return {
+            type: "FeatureCollection",
+            features: coastline.features.map((feature) => ({
+                type: "Feature",
+                properties: {"A3": feature.A3},
+                geometry: {
+                    type: "MultiPolygon",
+                    coordinates: feature.polygons.map((polygon) => polygon.map(decodeRing))
+                }
+            }))
+        };
+    });
+}
+
 function geoPlot(plotName, selector, world, data, centerLocation, scale, title = "Poleis in the Mediterranean") {
     let [width, height] = [300, 200];
 
@@ -580,14 +715,12 @@ function geoPlot(plotName, selector, world, data, centerLocation, scale, title =
         titleSize: 20
     });
 
-    let [projection1, callable_proj1] = scaledProjection(
-        d3.geoMercator()
+    let mercator = d3.geoMercator()
         .center(centerLocation)
         .scale(scale)
-        .translate([width / 2, height / 2]),
-        plot.xProj,
-        plot.yProj
-    );
+        .translate([width / 2, height / 2]);
+
+    let [projection1, callable_proj1] = scaledProjection(mercator, plot.xProj, plot.yProj);
 
     let pather = d3.geoPath()
         .projection(projection1);
@@ -625,7 +758,9 @@ function geoPlot(plotName, selector, world, data, centerLocation, scale, title =
     PlotElements[plotName] = {
         plot,
         world: worldData,
-        polis: polisData
+        polis: polisData,
+        projection: mercator,
+        project: callable_proj1
     };
 
     update({
@@ -636,27 +771,32 @@ function geoPlot(plotName, selector, world, data, centerLocation, scale, title =
 function makePlots() {
     // Load the data...
     Promise.all([
-        d3.csv("data/polis_data_distributed.csv"),
-        d3.json("data/countries-coastline-2km5.geo.json")
+        d3.json("data/polis.json"),
+        loadCoastline(coastlineLevel(500)),
+        loadCoastline(coastlineLevel(1300)),
+        d3.json("data/polis_index.json")
     ]).then((data) => {
-        // Unpack loaded files...
-        [DATA.polisData, DATA.world] = data;
+        // Unpack loaded files, the coastline is loaded at the detail each map scale needs...
+        DATA.world = {};
+        [DATA.polis, DATA.world[500], DATA.world[1300], DATA.polisIndex] = data;
+        DATA.polisData = columnsToRows(DATA.polis);
+        DATA.locatedPolis = DATA.polis.masks.located.map((i) => DATA.polisData[i]);
 
         console.log(DATA);
         geoPlot(
-            "plot1", "#figure1", DATA.world, DATA.polisData, [21.048012, 39.553127], 500,
+            "plot1", "#figure1", DATA.world[500], DATA.locatedPolis, [21.048012, 39.553127], 500,
             "Stasis Occurrences"
         );
         geoPlot(
-            "plot2", "#figure3", DATA.world, DATA.polisData, [24.048012, 38.053127], 1300,
+            "plot2", "#figure3", DATA.world[1300], DATA.locatedPolis, [24.048012, 38.053127], 1300,
             "Stasis Occurrences (Zoomed In)"
         );
         geoPlot(
-            "plot3", "#figure2", DATA.world, DATA.polisData, [21.048012, 39.553127], 500,
+            "plot3", "#figure2", DATA.world[500], DATA.locatedPolis, [21.048012, 39.553127], 500,
             "Area Within Polis"
         );
         geoPlot(
-            "plot4", "#figure4", DATA.world, DATA.polisData, [24.048012, 38.053127], 1300,
+            "plot4", "#figure4", DATA.world[1300], DATA.locatedPolis, [24.048012, 38.053127], 1300,
             "Area Within Polis (Zoomed In)"
         );
 
@@ -696,9 +836,8 @@ function makePlots() {
         let counts = {};
         let total = {}
         let histData = [];
-        for(let entry of DATA.polisData) {
-            if(entry["staseis"] == 0 || entry["area 1"] == 0) continue;
-
+        for(let i of DATA.polis.masks.area_class) {
+            let entry = DATA.polisData[i];
             counts[entry["area 1"]] = (counts[entry["area 1"]] ?? 0) + 1;
             total[entry["area 1"]] = (total[entry["area 1"]] ?? 0) + entry["staseis"];
         }
@@ -729,7 +868,7 @@ function makePlots() {
 
         addHover("#tooltip", histogram, (d) => "Area: " + d.area + "<br>Avg. Staseis: " + round(d.staseis))
 
-        DATA.filteredPolis = DATA.polisData.filter((d) => d.staseis !== 0 && d["area 2"] !== "" && d["area 2"] !== 0);
+        DATA.filteredPolis = DATA.polis.masks.area_scatter.map((i) => DATA.polisData[i]);
 
         PlotElements.linePlot = makePlotArea("#figure6", {
             yScaler: d3.scaleLinear,
@@ -0,0 +1,272 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import sys
+import time
+
+SOURCE_NAME = "countries-coastline-2km5.geo.json"
+
+# The maps drawn by geoPlot in charts.js, as (center, scale) of a d3.geoMercator over a 300 x 200 area. Everything
+# outside of all of them (plus PADDING degrees) is clipped away...
+VIEWS = [((21.048012, 39.553127), 500), ((24.048012, 38.053127), 1300)]
+VIEW_SIZE = (300, 200)
+PADDING = 1
+
+# Douglas-Peucker tolerance (in degrees) of each level, charts.js has a matching COASTLINE_TOLERANCES list and picks
+# the coarsest level that's still under half a pixel...
+TOLERANCES = [0.01, 0.02, 0.04, 0.08]
+
+# Coordinates are stored as integers on a grid of this many steps across the bounding box...
+QUANTIZATION = 2 ** 16
+
+# Hash of the source and of this script as of the last build, nothing is read while both match...
+MANIFEST_NAME = ".coastline_manifest.json"
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def level_path(this_dir: Path, level: int) -> Path:
+    return this_dir / f"coastline_{level}.json"
+
+
+def view_bbox(views: list = VIEWS, size: tuple = VIEW_SIZE, padding: float = PADDING) -> list[float]:
+    # Invert the mercator projection at the corners of each view, giving [west, south, east, north]...
+    width, height = size
+    west, south, east, north = math.inf, math.inf, -math.inf, -math.inf
+
+    for (lon, lat), scale in views:
+        center_y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+        half_lon = math.degrees(width / 2 / scale)
+        top = math.degrees(2 * math.atan(math.exp(center_y + height / 2 / scale)) - math.pi / 2)
+        bottom = math.degrees(2 * math.atan(math.exp(center_y - height / 2 / scale)) - math.pi / 2)
+
+        west, east = min(west, lon - half_lon), max(east, lon + half_lon)
+        south, north = min(south, bottom), max(north, top)
+
+    return [west - padding, south - padding, east + padding, north + padding]
+
+
+def clip_ring(ring: np.ndarray, bbox: list[float]) -> np.ndarray:
+    # Sutherland-Hodgman against each side of the box, vectorized over the edges of the ring. Takes and returns an
+    # open ring (no repeated closing point)...
+    import numpy as np
+
+    west, south, east, north = bbox
+    mins, maxs = ring.min(axis=0), ring.max(axis=0)
+
+    if(mins[0] >= west and mins[1] >= south and maxs[0] <= east and maxs[1] <= north):
+        return ring
+    if(maxs[0] < west or maxs[1] < south or mins[0] > east or mins[1] > north):
+        return ring[:0]
+
+    for axis, bound, below in [(0, west, False), (0, east, True), (1, south, False), (1, north, True)]:
+        if(len(ring) == 0):
+            break
+
+        prev = np.roll(ring, 1, axis=0)
+        inside = (ring[:, axis] <= bound) if(below) else (ring[:, axis] >= bound)
+        crossing = inside != np.roll(inside, 1)
+
+        # Each edge (prev -> point) puts out its crossing with the side if it has one, then its point if inside...
+        delta = ring[:, axis] - prev[:, axis]
+        t = np.divide(bound - prev[:, axis], delta, out=np.zeros(len(ring)), where=crossing)
+        out = np.stack([prev + t[:, None] * (ring - prev), ring], axis=1)
+        ring = out[np.stack([crossing, inside], axis=1)]
+
+    return ring
+
+
+def douglas_peucker(coords: np.ndarray, starts: np.ndarray, ends: np.ndarray, tolerance: float) -> np.ndarray:
+    # Keep mask over coords, which holds many open rings back to back (ring i is starts[i] to ends[i] inclusive).
+    # Every segment still being split, across all rings, is handled together each round: the distances of all their
+    # interior points are found at once, and reduceat gives the furthest point of each segment...
+    import numpy as np
+
+    keep = np.zeros(len(coords), dtype=bool)
+    mids = (starts + ends) // 2
+    keep[starts] = keep[mids] = keep[ends] = True
+
+    seg_start = np.concatenate([starts, mids])
+    seg_end = np.concatenate([mids, ends])
+
+    while(True):
+        active = seg_end - seg_start > 1
+        seg_start, seg_end = seg_start[active], seg_end[active]
+        if(len(seg_start) == 0):
+            break
+
+        lengths = seg_end - seg_start - 1
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        segment = np.repeat(np.arange(len(seg_start)), lengths)
+        points = seg_start[segment] + 1 + np.arange(lengths.sum()) - offsets[segment]
+
+        a, b, p = coords[seg_start[segment]], coords[seg_end[segment]], coords[points]
+        ab, ap = b - a, p - a
+        norm = np.hypot(ab[:, 0], ab[:, 1])
+        cross = np.abs(ab[:, 0] * ap[:, 1] - ab[:, 1] * ap[:, 0])
+        distance = np.where(norm > 0, cross / np.where(norm > 0, norm, 1), np.hypot(ap[:, 0], ap[:, 1]))
+
+        furthest = np.maximum.reduceat(distance, offsets)
+        first = np.flatnonzero(distance == furthest[segment])
+        first = first[np.unique(segment[first], return_index=True)[1]]
+
+        split = furthest > tolerance
+        mid = points[first][split]
+        keep[mid] = True
+
+        seg_start = np.concatenate([seg_start[split], mid])
+        seg_end = np.concatenate([mid, seg_end[split]])
+
+    return keep
+
+
+def load_polygons(path: Path, bbox: list[float]) -> list[tuple[str, list[list[np.ndarray]]]]:
+    # (A3 code, polygons) of each country, each polygon a list of open rings already clipped to bbox...
+    import numpy as np
+
+    with open(path) as f:
+        source = json.load(f)
+
+    countries = []
+    for feature in source["features"]:
+        geometry = feature["geometry"]
+        if(geometry is None):
+            continue
+        polygons = geometry["coordinates"] if(geometry["type"] == "MultiPolygon") else [geometry["coordinates"]]
+
+        clipped = []
+        for polygon in polygons:
+            rings = [clip_ring(np.array(ring, dtype=np.float64)[:-1], bbox) for ring in polygon]
+            # Holes can go, but not the outer ring...
+            if(len(rings) > 0 and len(rings[0]) >= 3):
+                clipped.append([rings[0]] + [ring for ring in rings[1:] if(len(ring) >= 3)])
+
+        if(len(clipped) > 0):
+            countries.append((feature["properties"]["A3"], clipped))
+
+    return countries
+
+
+def encode_ring(ring: np.ndarray, bbox: list[float]) -> list[int]:
+    # Quantize onto the grid and delta encode, first point absolute then [dx, dy, dx, dy, ...]. Points landing on the
+    # same grid cell as the one before are dropped...
+    import numpy as np
+
+    west, south, east, north = bbox
+    scale = np.array([(east - west) / (QUANTIZATION - 1), (north - south) / (QUANTIZATION - 1)])
+    q = np.round((ring - [west, south]) / scale).astype(np.int64)
+
+    deltas = np.diff(q, axis=0)
+    deltas = deltas[np.any(deltas != 0, axis=1)]
+    return np.concatenate([q[:1], deltas]).ravel().tolist()
+
+
+def build_level(countries: list, bbox: list[float], tolerance: float) -> dict:
+    import numpy as np
+
+    rings = [ring for a3, polygons in countries for polygon in polygons for ring in polygon]
+    lengths = np.array([len(ring) for ring in rings])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    keep = douglas_peucker(np.concatenate(rings), starts, starts + lengths - 1, tolerance)
+
+    features = []
+    i = 0
+    for a3, polygons in countries:
+        encoded = []
+        for polygon in polygons:
+            # A polygon whose outer ring is simplified away goes with it...
+            kept = []
+            outer = True
+            for j, ring in enumerate(polygon):
+                ring = encode_ring(ring[keep[starts[i]:starts[i] + lengths[i]]], bbox)
+                i += 1
+                if(len(ring) >= 6):
+                    kept.append(ring)
+                elif(j == 0):
+                    outer = False
+            if(outer):
+                encoded.append(kept)
+        if(len(encoded) > 0):
+            features.append({"A3": a3, "polygons": encoded})
+
+    west, south, east, north = bbox
+    return {
+        "bbox": bbox,
+        "tolerance": tolerance,
+        "transform": {
+            "scale": [(east - west) / (QUANTIZATION - 1), (north - south) / (QUANTIZATION - 1)],
+            "translate": [west, south]
+        },
+        "features": features
+    }
+
+
+def report(name: str, text: str, vertices: int):
+    start = time.perf_counter()
+    json.loads(text)
+    parse = time.perf_counter() - start
+
+    size = len(text.encode()) / 1024
+    compressed = len(gzip.compress(text.encode())) / 1024
+    print(f"{name:<36} {vertices:9} {size:10.1f} KB {compressed:10.1f} KB {parse * 1000:8.2f} ms")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Simplify the coastline into the levels drawn by the maps.")
+    parser.add_argument("--force", action="store_true", help="Build the levels even if they're up to date")
+    opts = parser.parse_args(args[1:])
+
+    this_dir = Path(args[0]).resolve().parent
+    source = this_dir / SOURCE_NAME
+    manifest_file = this_dir / MANIFEST_NAME
+
+    manifest = {}
+    if(manifest_file.exists() and all(level_path(this_dir, level).exists() for level in range(len(TOLERANCES)))):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    hashes = {source.name: file_hash(source), "script_sha1": file_hash(Path(__file__))}
+    if(not opts.force and manifest == hashes):
+        print("Coastline up to date.")
+        return
+
+    bbox = view_bbox()
+
+    countries = load_polygons(source, bbox)
+    print(f"Bounding box: {[round(v, 3) for v in bbox]}, {len(countries)} countries in view")
+    print(f"{'file':<36} {'vertices':>9} {'size':>13} {'gzipped':>13} {'parse':>11}")
+
+    text = source.read_text()
+    source_vertices = sum(
+        len(ring) for feature in json.loads(text)["features"] if(feature["geometry"] is not None)
+        for polygon in (
+            feature["geometry"]["coordinates"] if(feature["geometry"]["type"] == "MultiPolygon")
+            else [feature["geometry"]["coordinates"]]
+        )
+        for ring in polygon
+    )
+    report(source.name, text, source_vertices)
+
+    clipped = sum(len(ring) for a3, polygons in countries for polygon in polygons for ring in polygon)
+    print(f"{'(clipped to view)':<36} {clipped:9}")
+
+    for level, tolerance in enumerate(TOLERANCES):
+        asset = build_level(countries, bbox, tolerance)
+        text = json.dumps(asset, separators=(",", ":"))
+        level_path(this_dir, level).write_text(text)
+
+        vertices = sum(len(ring) // 2 for feature in asset["features"] for p in feature["polygons"] for ring in p)
+        report(level_path(this_dir, level).name, text, vertices)
+
+    with open(manifest_file, "w") as f:
+        json.dump(hashes, f, indent=4)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
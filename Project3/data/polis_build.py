@@ -0,0 +1,143 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import sys
+
+SOURCE_NAME = "polis_data_distributed.csv"
+DATASET_NAME = "polis.json"
+
+# Hash of the source and of this script as of the last build, nothing is read while both match...
+MANIFEST_NAME = ".polis_manifest.json"
+
+# The type of every column kept: "int" and "float" are numbers (missing entries become null), "category" columns are
+# stored as integer codes into a list of their values, and "text" is left as is. Columns not listed are dropped...
+SCHEMA = {
+    "polis#": "int",
+    "Name": "text",
+    "Polisity": "float",
+    "Hellenicity": "int",
+    "In/out": "int",
+    "staseis": "int",
+    "prom 1": "float",
+    "prom 2": "float",
+    "prom 3": "float",
+    "area 1": "float",
+    "area 2": "float",
+    "Silver": "float",
+    "Bronze": "float",
+    "Grid": "float",
+    "Colonies": "int",
+    "Victors": "int",
+    "Proxenoi": "int",
+    "Democracy": "category",
+    "Walls": "int",
+    "Delian L": "int",
+    "Koinon": "category",
+    "Region name": "category",
+    "Region #": "int",
+    "Latitude": "float",
+    "Longitude": "float",
+    "Pleiades link": "text",
+    "Elevation m": "float",
+}
+
+
+def coerce(data: pd.DataFrame) -> tuple[dict[str, list], dict[str, list]]:
+    # Returns (columns, categories), raising if a numeric column holds anything that isn't a number or empty, or an
+    # int column holds a fraction...
+    import numpy as np
+    import pandas as pd
+
+    columns = {}
+    categories = {}
+
+    for name, kind in SCHEMA.items():
+        values = data[name]
+
+        if(kind == "text"):
+            columns[name] = [None if(pd.isna(v)) else str(v).strip() for v in values]
+        elif(kind == "category"):
+            values = values.astype("string").str.strip()
+            codes, uniques = pd.factorize(values, sort=True)
+            columns[name] = [None if(code < 0) else int(code) for code in codes]
+            categories[name] = uniques.tolist()
+        else:
+            numbers = pd.to_numeric(values.replace(r"^\s*$", np.nan, regex=True), errors="raise").astype(np.float64)
+            if(kind == "int" and not np.all(np.isnan(numbers) | (numbers == np.round(numbers)))):
+                raise ValueError(f"Column {name} should hold whole numbers")
+            # Whole numbers are written without a ".0" either way, the page reads them the same...
+            columns[name] = [None if(np.isnan(v)) else (int(v) if(v == int(v)) else float(v)) for v in numbers]
+
+    return columns, categories
+
+
+def filter_masks(columns: dict[str, list]) -> dict[str, list[int]]:
+    # Row positions selected by each filter the page applies, so it never tests rows itself...
+    import numpy as np
+
+    def numbers(name):
+        return np.array([np.nan if(v is None) else v for v in columns[name]], dtype=np.float64)
+
+    staseis, area_1, area_2, latitude = (numbers(name) for name in ["staseis", "area 1", "area 2", "Latitude"])
+
+    masks = {
+        # On the maps...
+        "located": ~np.isnan(latitude),
+        # The "Total Controlled Area vs. Stasis Occurrences" bar chart...
+        "area_class": (staseis != 0) & (area_1 != 0) & ~np.isnan(area_1),
+        # The "Polis Area vs. Stasis Occurrences" scatter plot...
+        "area_scatter": (staseis != 0) & ~np.isnan(area_2) & (area_2 != 0),
+    }
+
+    return {name: np.flatnonzero(mask).tolist() for name, mask in masks.items()}
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def read_source(p: Path) -> pd.DataFrame:
+    # Everything is read as text, then given its type by coerce...
+    import pandas as pd
+
+    return pd.read_csv(p, dtype=str, keep_default_na=False, na_values=[""])
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Build the polis dataset read by the page.")
+    parser.add_argument("--force", action="store_true", help="Build the dataset even if it's up to date")
+    opts = parser.parse_args(args[1:])
+
+    this_dir = Path(args[0]).resolve().parent
+    source = this_dir / SOURCE_NAME
+    manifest_file = this_dir / MANIFEST_NAME
+
+    manifest = {}
+    if(manifest_file.exists() and (this_dir / DATASET_NAME).exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    hashes = {source.name: file_hash(source), "script_sha1": file_hash(Path(__file__))}
+    if(not opts.force and manifest == hashes):
+        print("Dataset up to date.")
+        return
+
+    data = read_source(source)
+    columns, categories = coerce(data)
+
+    with open(this_dir / DATASET_NAME, "w") as f:
+        json.dump(
+            {"rows": len(data), "columns": columns, "categories": categories, "masks": filter_masks(columns)},
+            f, separators=(",", ":")
+        )
+
+    with open(manifest_file, "w") as f:
+        json.dump(hashes, f, indent=4)
+
+    print(f"Wrote {len(data)} rows, {len(columns)} columns to {DATASET_NAME}")
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import sys
+
+SOURCE_NAME = "polis_data_distributed.csv"
+INDEX_NAME = "polis_index.json"
+
+# Coordinates are stored with this many decimals, about 1cm in mercator units at the scales on the page...
+PRECISION = 7
+
+# Hash of the source and of this script as of the last build, nothing is read while both match...
+MANIFEST_NAME = ".polis_index_manifest.json"
+
+
+def mercator(longitude: np.ndarray, latitude: np.ndarray) -> np.ndarray:
+    # Unscaled mercator (radians), the same projection as the maps up to d3's scale and translate, so the nearest
+    # polis here is also the nearest on screen...
+    import numpy as np
+
+    return np.stack([np.radians(longitude), np.log(np.tan(np.pi / 4 + np.radians(latitude) / 2))], axis=1)
+
+
+def build_kdtree(points: np.ndarray) -> np.ndarray:
+    # Implicit k-d tree, returned as an ordering of the points. The node for the range [lo, hi) is the point at
+    # mid = (lo + hi) // 2, splitting on x at even depths and y at odd ones, with its left subtree in [lo, mid) and
+    # right subtree in [mid + 1, hi). No pointers are needed, so the whole tree is just the reordered points...
+    import numpy as np
+
+    order = np.arange(len(points))
+    stack = [(0, len(points), 0)]
+
+    while(len(stack) > 0):
+        lo, hi, depth = stack.pop()
+        if(hi - lo <= 1):
+            continue
+
+        mid = (lo + hi) // 2
+        part = np.argpartition(points[order[lo:hi], depth % 2], mid - lo)
+        order[lo:hi] = order[lo:hi][part]
+
+        stack.append((lo, mid, depth + 1))
+        stack.append((mid + 1, hi, depth + 1))
+
+    return order
+
+
+def region_summaries(data: pd.DataFrame) -> dict:
+    # Totals per region, so the page never scans the poleis to describe a region...
+    summaries = {}
+    for region, rows in data.groupby("Region #", sort=True):
+        summaries[str(region)] = {
+            "name": rows["Region name"].iloc[0].strip(),
+            "poleis": int(len(rows)),
+            "staseis": int(rows["staseis"].sum()),
+            "with_staseis": int((rows["staseis"] > 0).sum()),
+            "area_classes": {
+                f"{area:g}": int(count) for area, count in rows["area 1"].value_counts().sort_index().items()
+            }
+        }
+    return summaries
+
+
+def build_index(data: pd.DataFrame) -> dict:
+    import numpy as np
+
+    located = data[data["Latitude"].notna() & data["Longitude"].notna()]
+    points = mercator(located["Longitude"].to_numpy(), located["Latitude"].to_numpy())
+    order = build_kdtree(points)
+
+    return {
+        # Rows are positions in the csv (the same as in the array d3.csv gives), in tree order...
+        "rows": located.index.to_numpy()[order].tolist(),
+        "x": np.round(points[order, 0], PRECISION).tolist(),
+        "y": np.round(points[order, 1], PRECISION).tolist(),
+        "regions": region_summaries(data)
+    }
+
+
+def nearest(index: dict, x: float, y: float) -> int:
+    # Reference search over the tree written by build_index, returns the csv row of the nearest polis. charts.js has
+    # the same search as nearestPolis...
+    import numpy as np
+
+    xs, ys = index["x"], index["y"]
+    best = [None, np.inf]
+
+    def search(lo, hi, depth):
+        if(lo >= hi):
+            return
+        mid = (lo + hi) // 2
+        d = (xs[mid] - x) ** 2 + (ys[mid] - y) ** 2
+        if(d < best[1]):
+            best[:] = [mid, d]
+
+        diff = (x - xs[mid]) if(depth % 2 == 0) else (y - ys[mid])
+        near, far = ((lo, mid), (mid + 1, hi)) if(diff < 0) else ((mid + 1, hi), (lo, mid))
+        search(*near, depth + 1)
+        if(diff ** 2 < best[1]):
+            search(*far, depth + 1)
+
+    search(0, len(xs), 0)
+    return index["rows"][best[0]]
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def read_source(p: Path) -> pd.DataFrame:
+    import pandas as pd
+
+    return pd.read_csv(p)
+
+
+def check_index(index: dict, data: pd.DataFrame):
+    # Check the tree against a brute force search before writing it...
+    import numpy as np
+
+    points = mercator(data["Longitude"].to_numpy(), data["Latitude"].to_numpy())
+    rng = np.random.default_rng(0)
+    for x, y in zip(rng.uniform(0, 0.7, 200), rng.uniform(0.6, 0.9, 200)):
+        brute = int(np.nanargmin((points[:, 0] - x) ** 2 + (points[:, 1] - y) ** 2))
+        assert nearest(index, x, y) == brute
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Build the nearest polis index read by the page.")
+    parser.add_argument("--force", action="store_true", help="Build the index even if it's up to date")
+    opts = parser.parse_args(args[1:])
+
+    this_dir = Path(args[0]).resolve().parent
+    source = this_dir / SOURCE_NAME
+    manifest_file = this_dir / MANIFEST_NAME
+
+    manifest = {}
+    if(manifest_file.exists() and (this_dir / INDEX_NAME).exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+    hashes = {source.name: file_hash(source), "script_sha1": file_hash(Path(__file__))}
+    if(not opts.force and manifest == hashes):
+        print("Index up to date.")
+        return
+
+    data = read_source(source)
+    index = build_index(data)
+    check_index(index, data)
+
+    with open(this_dir / INDEX_NAME, "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+    with open(manifest_file, "w") as f:
+        json.dump(hashes, f, indent=4)
+
+    print(f"Indexed {len(index['rows'])} of {len(data)} poleis, {len(index['regions'])} regions")
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -0,0 +1,136 @@
+from gprof2dot import CallgrindParser, ParseStats, SampledCallgrindParser
+from icicle import build_graph, compute_sizes
+from io import StringIO
+from pathlib import Path
+from synthetic import generate
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Number of times each case is run, the minimum and median are reported...
+REPEATS = 3
+
+# build_graph expands every path through cycles, which grows exponentially with depth on cyclic inputs, so the
+# benchmark builds to a fixed, smaller depth than the page...
+BUILD_DEPTH = 10
+
+# Synthetic inputs, parameters are passed straight to synthetic.generate...
+CASES = {
+    "small": dict(functions=200),
+    "wide": dict(functions=2000, fanout=8),
+    "cyclic": dict(functions=2000, recursion=0.2, cycles=0.1),
+    "large": dict(functions=2000, size=2_000_000),
+    # Function blocks (about 25 KB) bigger than the preview's windows...
+    "large_blocks": dict(functions=200, size=5_000_000),
+    "many_functions": dict(functions=10000, fanout=4, cycles=0.02),
+}
+
+# Profile passes run by CallgrindParser.parse, timed individually through ParseStats...
+PASSES = ["read", "validate", "find_cycles", "ratio", "call_ratios", "integrate"]
+
+
+def time_call(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def summarize(times: list[float]) -> dict:
+    return {"min": min(times), "median": statistics.median(times), "repeats": len(times)}
+
+
+def bench_case(text: str, repeats: int = REPEATS) -> dict:
+    timings = {name: [] for name in ["parse", *PASSES, "preview", "prune", "build_graph", "compute_sizes"]}
+
+    for i in range(repeats):
+        stats = ParseStats()
+        timings["parse"].append(time_call(lambda: CallgrindParser(StringIO(text), stats).parse()))
+        for phase in stats.phases:
+            timings[phase["name"]].append(phase["wall"])
+        # The sampled parse server.py serves first (the whole text on inputs small enough to be read in full), along
+        # with the graph drawn from it...
+        timings["preview"].append(
+            time_call(lambda: build_graph(SampledCallgrindParser(StringIO(text)).parse(), BUILD_DEPTH))
+        )
+
+        # Pruning and graph building modify or annotate what they're given, so each gets a fresh profile...
+        profile = CallgrindParser(StringIO(text)).parse()
+        timings["prune"].append(time_call(profile.prune, 0.005, 0.001, [], False))
+
+        profile = CallgrindParser(StringIO(text)).parse()
+        start = time.perf_counter()
+        graph = build_graph(profile, BUILD_DEPTH)
+        timings["build_graph"].append(time.perf_counter() - start)
+        timings["compute_sizes"].append(time_call(compute_sizes, graph, 1, 1 / 7))
+
+    return {
+        "bytes": len(text.encode()),
+        "lines": stats.lines,
+        "functions": stats.functions,
+        "calls": stats.calls,
+        "cycles": stats.cycles,
+        "timings": {name: summarize(times) for name, times in timings.items()}
+    }
+
+
+def git_commit(path: Path) -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict):
+    # Print how each timing moved relative to an earlier run, > 1 means slower now...
+    for case, result in results["cases"].items():
+        if(case not in baseline["cases"]):
+            continue
+        print(f"{case} (vs {baseline['commit']}):")
+        for name, timing in result["timings"].items():
+            old = baseline["cases"][case]["timings"].get(name)
+            if(old is None or old["min"] == 0):
+                continue
+            print(f"    {name:<14} {timing['min'] / old['min']:6.2f}x")
+
+
+def main(args):
+    # usage: benchmark.py [OUTPUT_JSON] [BASELINE_JSON]
+    this_dir = Path(args[0]).resolve().parent
+
+    inputs = {name: generate(**params) for name, params in CASES.items()}
+    for path in sorted((this_dir / "data").glob("callgrind.out.*")):
+        inputs[path.name] = path.read_text()
+
+    results = {
+        "commit": git_commit(this_dir),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": CASES,
+        "build_depth": BUILD_DEPTH,
+        "cases": {}
+    }
+
+    for name, text in inputs.items():
+        print(f"Running: {name}")
+        results["cases"][name] = result = bench_case(text)
+        for timing, t in result["timings"].items():
+            print(f"    {timing:<14} {t['min'] * 1000:10.2f}ms min {t['median'] * 1000:10.2f}ms median")
+
+    if(len(args) > 1):
+        with open(args[1], "w") as f:
+            json.dump(results, f, indent=4)
+
+    if(len(args) > 2):
+        with open(args[2]) as f:
+            compare(results, json.load(f))
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -1,46 +1,18 @@
 from browser import console, window, ajax, bind
-from dataclasses import dataclass
-from gprof2dot import CallgrindParser, TOTAL_TIME_RATIO, TIME_RATIO, UndefinedEvent
+from gprof2dot import CallgrindParser, SampledCallgrindParser, TOTAL_TIME_RATIO, TIME_RATIO, UndefinedEvent
+from icicle import CustomHierarchy, FunctionInfo, build_graph, compute_sizes, expand, from_dict, graft, pending
 from typing import Optional, Union
 from io import StringIO
+import json
 
 d3 = window.d3
 Promise = window.Promise
 
-@dataclass
-class CustomHierarchy:
-    data: FunctionInfo
-    depth: int
-    height: int
-    parent: "CustomHierarchy" = None
-    children: list["CustomHierarchy"] = None
-
-    @property
-    def value(self) -> float:
-        return self.data.total_time_ratio
-
-    def __iter__(self):
-        if(self.children is not None):
-            for c in self.children:
-                yield from c
-
-        yield self
-
-@dataclass
-class FunctionInfo:
-    name: str
-    full_name: str
-    time_ratio_all_calls: float = 0
-    total_time_ratio: float = 0
-    is_cycle: bool = False
-
-    def __str__(self) -> str:
-        return (
-            f"Full Name: {self.full_name}<br>"
-            f"Time Spent: {self.total_time_ratio * 100:.02f}%<br>"
-            f"Time Spent All Calls: {self.time_ratio_all_calls * 100:.02f}%<br>"
-        )
+# Icicle levels on screen at once, only this many are built below the node being viewed...
+VISIBLE_DEPTH = 7
 
+# Lines of a profile parsed between repaints while the full profile loads, see show_progressive...
+SLICE_LINES = 5000
 
 def is_visible(xScale, yScale):
     def info(d, i, elem, *_):
@@ -53,7 +25,28 @@ def is_visible(xScale, yScale):
     return info
 
 
-def new_icicle_chart(selector: str, width: int, height: int, graph: CustomHierarchy):
+def local_loader(node, depth_limit, callback):
+    callback(expand(node, depth_limit))
+
+
+def estimate_note(estimate: dict) -> str:
+    if(estimate["summary"] is not None):
+        total = f"total cost {estimate['summary']:.3g} reported"
+    elif(estimate["error"] is None):
+        total = f"total cost about {estimate['samples']:.3g}, too little read to bound it"
+    else:
+        total = f"total cost about {estimate['samples']:.3g} ± {estimate['error']:.2g}"
+    return (
+        f"Preview from {estimate['fraction'] * 100:.1f}% of the profile ({total}), shares are lower bounds. "
+        "Loading the full profile..."
+    )
+
+
+def new_icicle_chart(selector: str, width: int, height: int, graph: CustomHierarchy, loader = local_loader):
+    # loader is called as loader(node, depth_limit, callback) to build the callees of truncated nodes on zoom,
+    # and must pass the subtree rooted at that node's function, down to depth_limit, to the callback. Returns a
+    # replace(graph, loader, note) function, which redraws the chart with another graph (say the full profile once a
+    # preview is on screen), showing note under it when given...
     xScale = d3.scaleLinear().range([0, width])
     yScale = d3.scaleLinear().range([0, height])
 
@@ -75,32 +68,45 @@ def new_icicle_chart(selector: str, width: int, height: int, graph: CustomHierar
         .attr("font-size", "10px")
     )
 
-    g_list = list(graph)
+    rects = None
+    text = None
 
-    rects = (
-        svg.selectAll("rect").data(g_list).enter().append("rect")
-        .attr("x", d(lambda d: xScale(d.x0)))
-        .attr("y", d(lambda d: yScale(d.y0)))
-        .attr("width", d(lambda d: xScale(d.x1) - xScale(d.x0)))
-        .attr("height", d(lambda d: yScale(d.y1) - yScale(d.y0)))
-        .attr("fill", d(lambda d: "lightgrey" if(d.parent is None) else colormap(d.value)))
-        .attr("stroke-width", "1px")
-        .attr("stroke", "white")
-        .attr("rx", "0.5em")
-    )
+    def draw():
+        nonlocal rects
+        nonlocal text
 
-    text = (
-        svg.selectAll("info").data(g_list).enter().append("text")
-        .attr("text-anchor", "middle")
-        .attr("alignment-baseline", "middle")
-        .attr("x", d(lambda d: (xScale(d.x1) + xScale(d.x0)) / 2))
-        .attr("y", d(lambda d: (yScale(d.y1) + yScale(d.y0)) / 2))
-        .text(d(lambda d: f"{d.data.name} ({d.value * 100:.02f}%)"))
-        .attr("opacity", is_visible(xScale, yScale))
-        .style("pointer-events", "none")
-    )
+        g_list = list(graph)
 
-    def on_click(evt, data, *_):
+        if(rects is not None):
+            rects.remove()
+            text.remove()
+
+        rects = (
+            svg.selectAll("rect").data(g_list).enter().append("rect")
+            .attr("x", d(lambda d: xScale(d.x0)))
+            .attr("y", d(lambda d: yScale(d.y0)))
+            .attr("width", d(lambda d: xScale(d.x1) - xScale(d.x0)))
+            .attr("height", d(lambda d: yScale(d.y1) - yScale(d.y0)))
+            .attr("fill", d(lambda d: "lightgrey" if(d.parent is None) else colormap(d.value)))
+            .attr("stroke-width", "1px")
+            .attr("stroke", "white")
+            .attr("rx", "0.5em")
+        )
+
+        text = (
+            svg.selectAll("info").data(g_list).enter().append("text")
+            .attr("text-anchor", "middle")
+            .attr("alignment-baseline", "middle")
+            .attr("x", d(lambda d: (xScale(d.x1) + xScale(d.x0)) / 2))
+            .attr("y", d(lambda d: (yScale(d.y1) + yScale(d.y0)) / 2))
+            .text(d(lambda d: f"{d.data.name} ({d.value * 100:.02f}%)"))
+            .attr("opacity", is_visible(xScale, yScale))
+            .style("pointer-events", "none")
+        )
+
+        rects.on("click", on_click).on("mouseover", mouseon).on("mousemove", mousemove).on("mouseleave", mouseoff)
+
+    def zoom(data):
         xScale.domain([data.x0, data.x1])
         yScale.domain([data.y0, data.y0 + 1]).range([0 if(data.parent is None) else 10, height])
 
@@ -125,6 +131,29 @@ def new_icicle_chart(selector: str, width: int, height: int, graph: CustomHierar
 
         Promise.all([p1, p2]).then(lambda res: text.attr("opacity", is_visible(xScale, yScale)))
 
+    def on_click(evt, data, *_):
+        depth_limit = data.depth + VISIBLE_DEPTH
+        to_load = pending(data, depth_limit)
+
+        if(len(to_load) == 0):
+            return zoom(data)
+
+        # Some levels that will be on screen haven't been built yet, build them before zooming in...
+        remaining = len(to_load)
+
+        def on_subtree(node, subtree):
+            nonlocal remaining
+            graft(node, subtree)
+            remaining -= 1
+
+            if(remaining == 0):
+                compute_sizes(graph, 1, 1 / 7)
+                draw()
+                zoom(data)
+
+        for node in to_load:
+            loader(node, depth_limit, lambda subtree, node=node: on_subtree(node, subtree))
+
     def mouseon(evt, data, *_):
         tooltip.style("display", "inline")
 
@@ -135,55 +164,26 @@ def new_icicle_chart(selector: str, width: int, height: int, graph: CustomHierar
     def mouseoff(evt, data, *_):
         tooltip.style("display", "none")
 
-    def on_upload(evt, data, *_):
-        nonlocal rects
-        nonlocal text
-        nonlocal svg
+    def replace(new_graph: CustomHierarchy, new_loader = None, note: str = None):
+        nonlocal graph
+        nonlocal loader
 
-        reader = window.eval("new FileReader()")
+        xScale.range([0, width]).domain([0, 1])
+        yScale.range([0, height]).domain([0, 1])
 
-        def on_load(*_):
-            nonlocal rects
-            nonlocal text
-            nonlocal svg
+        graph = new_graph
+        if(new_loader is not None):
+            loader = new_loader
+        info_area.style("display", "none" if(note is None) else "block").text("" if(note is None) else note)
+        draw()
 
-            xScale.range([0, width]).domain([0, 1])
-            yScale.range([0, height]).domain([0, 1])
+    def on_upload(evt, data, *_):
+        reader = window.eval("new FileReader()")
 
+        def on_load(*_):
             try:
-                new_p = CallgrindParser(StringIO(reader.result))
-                profile = new_p.parse()
-                g = build_graph(profile)
-                g = compute_sizes(g, 1, 1 / 7)
-                g_list = list(g)
-
-                rects.remove()
-                text.remove()
-
-                rects = (
-                    svg.selectAll("rect").data(g_list).enter().append("rect")
-                    .attr("x", d(lambda d: xScale(d.x0)))
-                    .attr("y", d(lambda d: yScale(d.y0)))
-                    .attr("width", d(lambda d: xScale(d.x1) - xScale(d.x0)))
-                    .attr("height", d(lambda d: yScale(d.y1) - yScale(d.y0)))
-                    .attr("fill", d(lambda d: "lightgrey" if(d.parent is None) else colormap(d.value)))
-                    .attr("stroke-width", "1px")
-                    .attr("stroke", "white")
-                    .attr("rx", "0.5em")
-                )
-
-                text = (
-                    svg.selectAll("info").data(g_list).enter().append("text")
-                    .attr("text-anchor", "middle")
-                    .attr("alignment-baseline", "middle")
-                    .attr("x", d(lambda d: (xScale(d.x1) + xScale(d.x0)) / 2))
-                    .attr("y", d(lambda d: (yScale(d.y1) + yScale(d.y0)) / 2))
-                    .text(d(lambda d: f"{d.data.name} ({d.value * 100:.02f}%)"))
-                    .attr("opacity", is_visible(xScale, yScale))
-                    .style("pointer-events", "none")
-                )
-
-                rects.on("click", on_click).on("mouseover", mouseon).on("mousemove", mousemove).on("mouseleave", mouseoff)
+                # Uploaded profiles are built locally, not fetched...
+                show_progressive(reader.result, replace, local_loader)
             except Exception as e:
                 info_area.style("display", "block").text(f"Error occured on update: {e}")
                 raise e
@@ -192,104 +192,184 @@ def new_icicle_chart(selector: str, width: int, height: int, graph: CustomHierar
         reader.readAsText(evt.target.files[0])
 
     file_upload.on("change", on_upload)
-    rects.on("click", on_click).on("mouseover", mouseon).on("mousemove", mousemove).on("mouseleave", mouseoff)
+    draw()
 
+    return replace
 
-def show(text1, text2):
-    for selector, text in zip(["#figure1", "#figure2"], [text1, text2]):
-        parser = CallgrindParser(StringIO(text))
-        profile = parser.parse()
-        root_node = build_graph(profile)
-        root_node = compute_sizes(root_node, 1, 1 / 7)
-        new_icicle_chart(selector, 900, 200, root_node)
 
+def new_sweep_heatmap(selector: str, width: int, height: int, sweep: dict):
+    label_width = 200
+    values = [str(v) for v in sweep["values"]]
+    names = [f"{i}: {f['name']}" for i, f in enumerate(sweep["functions"])]
 
-    d3.selectAll(".loading").style("display", "none")
+    xScale = d3.scaleBand().domain(values).range([label_width, width - label_width / 2]).padding(0.05)
+    yScale = d3.scaleBand().domain(names).range([20, height]).padding(0.05)
 
+    def colormap(value):
+        return d3.interpolateYlOrRd(0.2 + value * 0.65)
 
-def build_graph(profile, depth_limit = 20) -> CustomHierarchy:
-    root = sorted([f for f in profile.functions.values()], key=lambda a: a.events[TOTAL_TIME_RATIO], reverse=True)[0]
+    def d(func):
+        return lambda d, *_: func(d)
 
-    return _build_graph(profile, root, 0, depth_limit)
+    tooltip = d3.select("#tooltip")
 
-def _build_graph(profile, func, depth, depth_limit = 100, parent = None, sub_ratio = 1) -> Optional[CustomHierarchy]:
-    # Create a new node for ourself...
-    data = FunctionInfo(
-        func.stripped_name(),
-        func.name,
-        func.events[TOTAL_TIME_RATIO],
-        sub_ratio
+    svg = (
+        d3.select(selector)
+        .append("svg").attr("viewBox", f"0 0 {width} {height}")
+        .attr("preserveAspectRatio", "xMidYMid meet").attr("class", "chart")
+        .append("g").attr("class", "chartArea")
+        .attr("font-size", "10px")
     )
 
-    new_node = CustomHierarchy(
-        data,
-        depth,
-        0,
-        parent,
-        None
+    cells = [
+        {"name": name, "value": value, "func": func, "total": func["total"][j], "self": func["self"][j]}
+        for name, func in zip(names, sweep["functions"])
+        for j, value in enumerate(values)
+    ]
+
+    rects = (
+        svg.selectAll("rect").data(cells).enter().append("rect")
+        .attr("x", d(lambda d: xScale(d["value"])))
+        .attr("y", d(lambda d: yScale(d["name"])))
+        .attr("width", xScale.bandwidth())
+        .attr("height", yScale.bandwidth())
+        .attr("fill", d(lambda d: colormap(d["total"])))
+        .attr("rx", "0.5em")
     )
 
-    if(len(func.calls) == 0 or depth >= depth_limit):
-        return new_node
+    (
+        svg.selectAll("info").data(cells).enter().append("text")
+        .attr("text-anchor", "middle")
+        .attr("alignment-baseline", "middle")
+        .attr("x", d(lambda d: xScale(d["value"]) + xScale.bandwidth() / 2))
+        .attr("y", d(lambda d: yScale(d["name"]) + yScale.bandwidth() / 2))
+        .text(d(lambda d: f"{d['total'] * 100:.02f}%"))
+        .style("pointer-events", "none")
+    )
 
-    new_node.children = []
+    # Function names on the left, change in share on the right...
+    (
+        svg.selectAll("names").data(sweep["functions"]).enter().append("text")
+        .attr("text-anchor", "end")
+        .attr("alignment-baseline", "middle")
+        .attr("x", label_width - 5)
+        .attr("y", lambda f, i, *_: yScale(names[i]) + yScale.bandwidth() / 2)
+        .text(d(lambda f: f["name"][:35]))
+    )
 
-    sub_ratio_calls = 0
+    (
+        svg.selectAll("growth").data(sweep["functions"]).enter().append("text")
+        .attr("text-anchor", "start")
+        .attr("alignment-baseline", "middle")
+        .attr("x", width - label_width / 2 + 5)
+        .attr("y", lambda f, i, *_: yScale(names[i]) + yScale.bandwidth() / 2)
+        .text(d(lambda f: f"{f['growth'] * 100:+.02f}%"))
+    )
 
-    for name, callObj in func.calls.items():
-        try:
-            call_time = callObj[TOTAL_TIME_RATIO]
-        except UndefinedEvent:
-            # Recursive, TODO: Change...
-            call_time = sub_ratio * (sub_ratio / (1 if(parent is None or parent.value == 0) else parent.value))
+    (
+        svg.selectAll("columns").data(values).enter().append("text")
+        .attr("text-anchor", "middle")
+        .attr("x", lambda v, *_: xScale(v) + xScale.bandwidth() / 2)
+        .attr("y", 10)
+        .text(lambda v, *_: f"{sweep['parameter']} = {v}")
+    )
 
-        sub_ratio_calls += call_time
+    def mouseon(evt, data, *_):
+        tooltip.style("display", "inline")
 
-    correction_mult = 1 if(sub_ratio_calls <= sub_ratio) else sub_ratio / sub_ratio_calls
+    def mousemove(evt, data, *_):
+        tooltip.html(
+            f"Full Name: {data['func']['full_name']}<br>"
+            f"{sweep['parameter']}: {data['value']}<br>"
+            f"Time Spent: {data['total'] * 100:.02f}%<br>"
+            f"Self Time: {data['self'] * 100:.02f}%<br>"
+        )
+        tooltip.style("left", f"{evt.clientX}px").style("top", f"{(evt.clientY - 10)}px")
 
-    for name, callObj in func.calls.items():
-        try:
-            call_time = callObj[TOTAL_TIME_RATIO] * correction_mult
-        except UndefinedEvent:
-            # Recursive, TODO: Change...
-            call_time = sub_ratio * (sub_ratio / (1 if(parent is None or parent.value == 0) else parent.value)) * correction_mult
+    def mouseoff(evt, data, *_):
+        tooltip.style("display", "none")
 
-        new_node.children.append(
-            _build_graph(profile, profile.functions[name], depth + 1, depth_limit, new_node, call_time)
-        )
+    rects.on("mouseover", mouseon).on("mousemove", mousemove).on("mouseleave", mouseoff)
 
-    new_node.height = max(c.height for c in new_node.children) + 1
 
-    return new_node
+def profile_graph(profile) -> CustomHierarchy:
+    return compute_sizes(build_graph(profile, VISIBLE_DEPTH), 1, 1 / 7)
 
-def compute_sizes(graph: CustomHierarchy, width: int, node_depth: int, offset: float = 0) -> CustomHierarchy:
-    px0, py0, px1, py1 = (
-        (0, 0, width, 0)
-        if(graph.parent is None) else
-        (graph.parent.x0, graph.parent.y0, graph.parent.x1, graph.parent.y1)
-    )
 
-    graph.x0 = px0 + offset
-    graph.y0 = py1
-    if(graph.parent is not None and graph.parent.value == 0):
-        graph.x1 = graph.x0
-    else:
-        if(graph.parent is not None):
-            graph.x1 = graph.x0 + (graph.value / graph.parent.value) * (px1 - px0)
+def show_progressive(text: str, replace, loader = local_loader):
+    # Draws a sample of the profile first, then parses all of it in slices of SLICE_LINES lines, handing the page back
+    # to the browser between them so it stays responsive. Small profiles are sampled whole, so they're drawn once...
+    parser = SampledCallgrindParser(StringIO(text))
+    estimate_profile = parser.parse()
+    if(parser.estimate["fraction"] >= 1):
+        return replace(profile_graph(estimate_profile), loader)
+
+    replace(profile_graph(estimate_profile), loader, estimate_note(parser.estimate))
+
+    slices = CallgrindParser(StringIO(text)).parse_slices(SLICE_LINES)
+
+    def refine():
+        profile = next(slices)
+        if(profile is None):
+            window.setTimeout(refine, 0)
         else:
-            graph.x1 = graph.x0 + 1
-    graph.y1 = py1 + node_depth
+            replace(profile_graph(profile), loader)
+
+    window.setTimeout(refine, 0)
 
-    if(graph.children is None):
-        return
 
-    sub_offset = 0
+def show(text1, text2):
+    for selector, text in zip(["#figure1", "#figure2"], [text1, text2]):
+        parser = CallgrindParser(StringIO(text))
+        profile = parser.parse()
+        root_node = build_graph(profile, VISIBLE_DEPTH)
+        root_node = compute_sizes(root_node, 1, 1 / 7)
+        new_icicle_chart(selector, 900, 200, root_node)
+
+
+    d3.selectAll(".loading").style("display", "none")
 
-    for i, c in enumerate(graph.children):
-        compute_sizes(c, width, node_depth, sub_offset)
-        sub_offset = c.x1 - graph.x0
 
-    return graph
+def subtree_url(profile_id: str, depth: int, root: str = None, ratio: float = 1) -> str:
+    enc = window.encodeURIComponent
+    url = f"profile/{enc(profile_id)}/subtree?depth={depth}&ratio={ratio}"
+    return url if(root is None) else f"{url}&root={enc(root)}"
+
+
+def server_loader(profile_id: str, preview: bool = False):
+    # With preview, subtrees don't wait for the server to finish parsing the profile...
+    def load(node, depth_limit, callback):
+        def on_complete(req):
+            callback(from_dict(json.loads(req.text), node.depth, node.parent))
+
+        url = subtree_url(profile_id, depth_limit - node.depth, node.data.full_name, node.value)
+        ajax.get(f"{url}&preview=1" if(preview) else url, oncomplete=on_complete)
+
+    return load
+
+
+def show_from_server(profile_ids):
+    # Only the levels on screen are fetched up front, the rest come from the server as nodes get zoomed into. Big
+    # profiles are drawn from a sample first, while the server parses all of it, then the chart is swapped for the
+    # full one. Zooming into the preview fetches exact subtrees, parsed from only the blocks they need...
+    for selector, profile_id in zip(["#figure1", "#figure2"], profile_ids):
+        def on_full(req, replace, profile_id=profile_id):
+            replace(compute_sizes(from_dict(json.loads(req.text)), 1, 1 / 7), server_loader(profile_id))
+
+        def on_preview(req, selector=selector, profile_id=profile_id):
+            data = json.loads(req.text)
+            root_node = compute_sizes(from_dict(data), 1, 1 / 7)
+            replace = new_icicle_chart(selector, 900, 200, root_node, server_loader(profile_id, not data["complete"]))
+            d3.select(selector).select(".loading").style("display", "none")
+
+            if(not data["complete"]):
+                replace(root_node, None, estimate_note(data["estimate"]))
+                ajax.get(
+                    subtree_url(profile_id, VISIBLE_DEPTH),
+                    oncomplete=lambda req, replace=replace: on_full(req, replace)
+                )
+
+        ajax.get(f"{subtree_url(profile_id, VISIBLE_DEPTH)}&preview=1", oncomplete=on_preview)
 
 
 def show_graph(obj, node, depth, depth_limit = 9, ratio = 1):
@@ -307,7 +387,18 @@ def show_graph(obj, node, depth, depth_limit = 9, ratio = 1):
         show_graph(obj, obj.functions[f], depth + 1, depth_limit, c.ratio)
 
 
-with open("data/callgrind.out.134422.switchsize2") as a:
-    with open("data/callgrind.out.134671.switchsize128") as b:
-        print("Running...")
-        show(a.read(), b.read())
+def on_profiles(req):
+    # When served by server.py, profiles are parsed once on the server, otherwise parse them here...
+    if(req.status == 200):
+        return show_from_server(json.loads(req.text))
+
+    with open("data/callgrind.out.134422.switchsize2") as a:
+        with open("data/callgrind.out.134671.switchsize128") as b:
+            print("Running...")
+            show(a.read(), b.read())
+
+
+ajax.get("profile/", oncomplete=on_profiles)
+
+with open("data/sweep.json") as f:
+    new_sweep_heatmap("#figure3", 900, 500, json.load(f))
@@ -24,9 +24,13 @@ __author__ = "Jose Fonseca et al"
 import sys
 import math
 from os.path import basename
+import os.path
 import re
 import locale
 import fnmatch
+import time
+import json
+import io
 
 # Python 2.x/3.x compatibility
 if sys.version_info[0] >= 3:
@@ -844,6 +848,143 @@ class ParseError(Exception):
         return '%s: %r' % (self.msg, self.line)
 
 
+class ParseStats:
+    """Timings and counts collected while parsing a profile.
+
+    Pass an instance to a parser to enable collection; parsers given no
+    stats object skip all bookkeeping. Peak memory is measured with
+    tracemalloc, which is slow, so it is only traced when asked for. Tracing
+    runs from the first phase to the end of the parse, so each phase's peak
+    includes whatever earlier phases still hold.
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = []
+        self.lines = 0
+        self.bytes = 0
+        self.functions = 0
+        self.calls = 0
+        self.cycles = 0
+        self.peak_memory = None
+        self._started_tracing = False
+
+    def phase(self, name):
+        if self.trace_memory and not self._started_tracing:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        return _StatsPhase(self, name)
+
+    def finish(self, profile, lines):
+        """Count the parsed profile and stop tracing memory, at the end of a parse."""
+
+        self.count(profile, lines)
+        if self._started_tracing:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def count(self, profile, lines):
+        self.lines = lines
+        self.functions = len(profile.functions)
+        self.calls = sum(len(function.calls) for function in compat_itervalues(profile.functions))
+        self.cycles = len(profile.cycles)
+
+    @property
+    def wall_time(self):
+        return sum(phase['wall'] for phase in self.phases)
+
+    @property
+    def cpu_time(self):
+        return sum(phase['cpu'] for phase in self.phases)
+
+    def to_dict(self):
+        return {
+            'phases': self.phases,
+            'wall': self.wall_time,
+            'cpu': self.cpu_time,
+            'lines': self.lines,
+            'bytes': self.bytes,
+            'functions': self.functions,
+            'calls': self.calls,
+            'cycles': self.cycles,
+            'peak_memory': self.peak_memory,
+        }
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def report(self, file=sys.stderr):
+        for phase in self.phases:
+            file.write('%-12s %10.4fs wall %10.4fs cpu' % (phase['name'], phase['wall'], phase['cpu']))
+            if phase.get('peak_memory') is not None:
+                file.write(' %12u bytes peak %12u bytes after' % (phase['peak_memory'], phase['memory']))
+            file.write('\n')
+        file.write('%-12s %10.4fs wall %10.4fs cpu\n' % ('total', self.wall_time, self.cpu_time))
+        file.write('%u lines, %u bytes, %u functions, %u calls, %u cycles\n' % (
+            self.lines, self.bytes, self.functions, self.calls, self.cycles))
+        if self.peak_memory is not None:
+            file.write('peak memory: %u bytes\n' % self.peak_memory)
+
+
+class _StatsPhase:
+    """Context manager timing a single parse phase into a ParseStats."""
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        if self.stats.trace_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        phase = {
+            'name': self.name,
+            'wall': time.perf_counter() - self._wall,
+            'cpu': time.process_time() - self._cpu,
+        }
+        if self.stats.trace_memory:
+            import tracemalloc
+            phase['memory'], phase['peak_memory'] = tracemalloc.get_traced_memory()
+            self.stats.peak_memory = max(self.stats.peak_memory or 0, phase['peak_memory'])
+        self.stats.phases.append(phase)
+        return False
+
+
+class _NoStatsPhase:
+    """Stand-in for _StatsPhase when no stats are being collected."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_no_stats_phase = _NoStatsPhase()
+
+
+class _CountingStream:
+    """Wrap a stream, counting the bytes read through readline."""
+
+    def __init__(self, stream, stats):
+        self._stream = stream
+        self._stats = stats
+        self.encoding = getattr(stream, 'encoding', None)
+
+    def readline(self):
+        line = self._stream.readline()
+        self._stats.bytes += len(line.encode('utf-8')) if isinstance(line, str) else len(line)
+        return line
+
+
 class Parser:
     """Parser interface."""
 
@@ -882,6 +1023,13 @@ class LineParser(Parser):
             line = line.decode(encoding)
         self.__line = line
 
+    def restart(self, stream):
+        """Continue parsing from the start of another stream."""
+        self._stream = stream
+        self.__line = None
+        self.__eof = False
+        self.readline()
+
     def lookahead(self):
         assert self.__line is not None
         return self.__line
@@ -906,9 +1054,14 @@ class CallgrindParser(LineParser):
 
     _call_re = re.compile(r'^calls=\s*(\d+)\s+((\d+|\+\d+|-\d+|\*)\s+)+$')
 
-    def __init__(self, infile):
+    def __init__(self, infile, stats=None):
         LineParser.__init__(self, infile)
 
+        # Optional ParseStats, filled in by parse()
+        self.stats = stats
+        if stats is not None:
+            self._stream = _CountingStream(self._stream, stats)
+
         # Textual positions
         self.position_ids = {}
         self.positions = {}
@@ -926,25 +1079,75 @@ class CallgrindParser(LineParser):
         self.profile[SAMPLES] = 0
 
     def parse(self):
-        # read lookahead
-        self.readline()
+        stats = self.stats
+        if stats is None:
+            phase = lambda name: _no_stats_phase
+        else:
+            phase = stats.phase
+
+        with phase('read'):
+            # read lookahead
+            self.readline()
+
+            self.parse_key('version')
+            self.parse_key('creator')
+            while self.parse_part():
+                pass
+            if not self.eof():
+                sys.stderr.write('warning: line %u: unexpected line\n' % self.line_no)
+                sys.stderr.write('%s\n' % self.lookahead())
+
+        self.derive(phase)
+
+        if stats is not None:
+            stats.finish(self.profile, self.line_no)
+
+        return self.profile
 
+    def parse_slices(self, lines=10000):
+        """Same as parse, but as a generator yielding None after about every
+        `lines` lines read, and the profile once done.
+
+        Lets a caller with a single thread (a page, say) do other work
+        between slices of a long parse. The passes run once everything is
+        read are not split, and stats are not recorded.
+        """
+
+        self.readline()
         self.parse_key('version')
         self.parse_key('creator')
-        while self.parse_part():
-            pass
+
+        mark = self.line_no
+        # parse_part, yielding from the body
+        while self.parse_header_line():
+            while self.parse_header_line():
+                pass
+            if not self.parse_body_line():
+                break
+            while self.parse_body_line():
+                if self.line_no - mark >= lines:
+                    mark = self.line_no
+                    yield None
         if not self.eof():
             sys.stderr.write('warning: line %u: unexpected line\n' % self.line_no)
             sys.stderr.write('%s\n' % self.lookahead())
+        yield None
 
-        # compute derived data
-        self.profile.validate()
-        self.profile.find_cycles()
-        self.profile.ratio(TIME_RATIO, SAMPLES)
-        self.profile.call_ratios(SAMPLES2)
-        self.profile.integrate(TOTAL_TIME_RATIO, TIME_RATIO)
+        self.derive(lambda name: _no_stats_phase)
+        yield self.profile
 
-        return self.profile
+    def derive(self, phase):
+        # compute derived data
+        with phase('validate'):
+            self.profile.validate()
+        with phase('find_cycles'):
+            self.profile.find_cycles()
+        with phase('ratio'):
+            self.profile.ratio(TIME_RATIO, SAMPLES)
+        with phase('call_ratios'):
+            self.profile.call_ratios(SAMPLES2)
+        with phase('integrate'):
+            self.profile.integrate(TOTAL_TIME_RATIO, TIME_RATIO)
 
     def parse_part(self):
         if not self.parse_header_line():
@@ -1137,12 +1340,17 @@ class CallgrindParser(LineParser):
             if name:
                 self.position_ids[(table, id)] = name
             else:
-                name = self.position_ids.get((table, id), '')
+                name = self.position_ids.get((table, id))
+                if name is None:
+                    name = self.unknown_position(table, id)
         self.positions[self._position_map[position]] = name
 
         self.consume()
         return True
 
+    def unknown_position(self, table, id):
+        return ''
+
     def parse_empty(self):
         if self.eof():
             return False
@@ -1212,4 +1420,588 @@ class CallgrindParser(LineParser):
         while True:
             LineParser.readline(self)
             if self.eof() or not self.lookahead().startswith('#'):
-                break
\ No newline at end of file
+                break
+
+
+def _partial_ratios(profile, total):
+    """Time ratios of a profile parsed from only some of its function blocks.
+
+    Each call line holds the exact inclusive cost of that call, however
+    little of the rest of the profile was read, so a function's total is
+    the larger of what its parsed callers spent in it and what its own
+    parsed blocks spent (self plus calls). Both only count what was seen,
+    so totals are lower bounds (exact for a function whose blocks were all
+    parsed, barring recursion), as ratios of the given total.
+    """
+
+    inbound = {}
+    for function in compat_itervalues(profile.functions):
+        for call in compat_itervalues(function.calls):
+            if call.callee_id != function.id:
+                inbound[call.callee_id] = inbound.get(call.callee_id, 0.0) + call[SAMPLES2]
+                call[TOTAL_TIME_RATIO] = min(call[SAMPLES2] / total, 1.0)
+
+    for function in compat_itervalues(profile.functions):
+        own = function[SAMPLES] + sum(
+            call[SAMPLES2] for call in compat_itervalues(function.calls) if call.callee_id != function.id
+        )
+        function[TIME_RATIO] = min(function[SAMPLES] / total, 1.0)
+        function[TOTAL_TIME_RATIO] = min(max(own, inbound.get(function.id, 0.0)) / total, 1.0)
+
+    profile[TIME_RATIO] = 1.0
+    profile[TOTAL_TIME_RATIO] = 1.0
+
+
+class _OffsetStream:
+    """Read text lines from a text or binary stream, tracking offsets.
+
+    Offsets are in the stream's own units (characters or bytes), so they
+    can be passed back to its seek.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self.offset = 0
+        self.line_offset = 0
+        self.encoding = getattr(stream, 'encoding', None)
+
+    def readline(self):
+        line = self._stream.readline()
+        self.line_offset = self.offset
+        self.offset += len(line)
+        return line.decode('utf-8', 'replace') if isinstance(line, bytes) else line
+
+
+# Two sided 95% quantiles of Student's t distribution, by degrees of freedom
+_T95 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+
+def _t95(df):
+    """95% quantile of Student's t with df degrees of freedom, approaching 1.96 past the table."""
+
+    if df <= len(_T95):
+        return _T95[df - 1]
+    return 1.96 + (_T95[-1] - 1.96) * len(_T95) / df
+
+
+def _spread(n):
+    """0 to n - 1, ordered so that every prefix is spread across the range (bit reversed counting)."""
+
+    bits = max(n - 1, 1).bit_length()
+    order = []
+    for k in range(1 << bits):
+        i = int(bin(k)[2:].zfill(bits)[::-1], 2)
+        if i < n:
+            order.append(i)
+    return order
+
+
+class SampledCallgrindParser(CallgrindParser):
+    """Approximate callgrind parser reading an evenly spaced sample of the body.
+
+    The body is split into `windows` evenly spaced windows, together covering
+    about `fraction` of it. A function block runs from one fn= line up to the
+    next, and every block overlapping a window is parsed whole, even where it
+    runs past the window's edges, so each window yields at least one block
+    however big the blocks are. Windows are read in an order spreading them
+    across the body, stopping once `fraction` of it and MIN_BLOCKS blocks
+    were read, so big blocks don't have every window read. The position context is reset at the
+    start of each block, so costs are never attributed to the wrong function.
+    Compressed function names are collected from the whole file first with a
+    plain regex scan (far quicker than parsing), unless `names` is false, in
+    which case names defined outside of the sample are shown as the table and
+    id, e.g. "fn#702".
+
+    The stream must support seek. After parse, `estimate` holds the total
+    SAMPLES of the whole profile, a 95% error bound, and the fraction of the
+    body read. The total is the summary in the header when there is one,
+    with an error of 0. Otherwise it is estimated from the sample: a window
+    at a uniformly random offset overlaps a block with probability
+    proportional to the block's length plus the window's, so each window
+    estimates the total by scaling the samples of every block it overlaps by
+    the inverse of that probability, in bytes. The estimate is the mean over
+    the windows, and the bound uses a t quantile, as there are few windows.
+    The bound is None when fewer than MIN_BLOCKS blocks were read, too few to
+    tell anything. Costs concentrated in a few short blocks can still be
+    missed by every window, with a bound too tight to show it. Files small
+    enough to be covered by the windows are parsed in full, with an error of
+    0: with the defaults, bodies up to `windows * MIN_WINDOW` bytes (256 KB),
+    beyond which windows grow with the file.
+    """
+
+    # Smallest window read
+    MIN_WINDOW = 4 * 1024
+    # Fewest blocks an error bound is given for
+    MIN_BLOCKS = 5
+    # Size of the reads when looking for the ends of a block
+    SEARCH_CHUNK = 64 * 1024
+    # Size of the reads when scanning for function names
+    SCAN_CHUNK = 16 * 1024 * 1024
+
+    _name_re = re.compile(r'^c?fn=\((\d+)\)[ \t]*(\S.*?)\r?$', re.M)
+
+    def __init__(self, infile, fraction=0.02, windows=64, names=True, stats=None):
+        self._offsets = _OffsetStream(infile)
+        CallgrindParser.__init__(self, self._offsets, stats)
+        self._source = infile
+        self.fraction = fraction
+        self.windows = windows
+        self.names = names
+        self.summary = None
+        self.estimate = None
+
+    def parse(self):
+        stats = self.stats
+        if stats is None:
+            phase = lambda name: _no_stats_phase
+        else:
+            phase = stats.phase
+
+        with phase('sample'):
+            self.readline()
+            self.parse_key('version')
+            self.parse_key('creator')
+            while self.parse_header_line():
+                pass
+
+            start = self._offsets.line_offset
+            self._source.seek(0, 2)
+            end = self._source.tell()
+            body = end - start
+            size = max(int(body * self.fraction / self.windows), self.MIN_WINDOW)
+
+            if size * self.windows >= body:
+                # The windows would cover everything anyway
+                self._parse_block(self._read(start, body))
+                self.estimate = {'samples': self.profile[SAMPLES], 'error': 0.0, 'fraction': 1.0, 'windows': 1,
+                                 'blocks': None, 'summary': self.summary}
+            else:
+                if self.names:
+                    self._scan_names(start)
+                self.estimate = self._sample(start, end, size)
+                self.estimate['summary'] = self.summary
+                if self.summary is not None:
+                    self.estimate['samples'] = self.summary
+                    self.estimate['error'] = 0.0
+
+        self.derive(phase)
+
+        if stats is not None:
+            stats.finish(self.profile, self.line_no)
+
+        return self.profile
+
+    def _sample(self, start, end, size):
+        """Parse the blocks overlapping each window, returns the estimate."""
+        body = end - start
+        # Window offsets range over [start, end - size], step apart
+        offsets = end - size - start + 1
+        step = (offsets - 1) / max(self.windows - 1, 1)
+
+        blocks = {}
+        totals = []
+        read = 0
+        for i in _spread(self.windows):
+            if read >= body * self.fraction and len(blocks) >= self.MIN_BLOCKS and len(totals) > 1:
+                break
+            offset = start + int(i * step)
+            first = self._block_start(offset, start)
+            last = self._block_end(offset + size - 1, end)
+            text = self._read(first, last - first)
+            marker = self._marker(text)
+
+            total = 0.0
+            begin = first
+            while begin < last:
+                found = text.find(marker, begin - first)
+                stop = last if found < 0 else first + found + 1
+                if begin not in blocks:
+                    blocks[begin] = (stop, self._parse_block(text[begin - first:stop - first]))
+                    read += stop - begin
+                # Window offsets overlapping [begin, stop), out of all of them
+                overlap = min(stop, end - size + 1) - max(begin - size + 1, start)
+                total += blocks[begin][1] * offsets / overlap
+                begin = stop
+            totals.append(total)
+
+        if read >= body:
+            # Every block got parsed
+            return {'samples': self.profile[SAMPLES], 'error': 0.0, 'fraction': 1.0, 'windows': len(totals),
+                    'blocks': len(blocks)}
+
+        n = len(totals)
+        mean = sum(totals) / n
+        error = None
+        if n > 1 and len(blocks) >= self.MIN_BLOCKS:
+            # Windows are treated as a simple random sample of all offsets, with the finite population correction
+            variance = sum((total - mean) ** 2 for total in totals) / (n - 1)
+            covered = min(n * size / body, 1.0)
+            error = _t95(n - 1) * math.sqrt((1 - covered) * variance / n)
+
+        return {'samples': mean, 'error': error, 'fraction': read / body, 'windows': n, 'blocks': len(blocks)}
+
+    def _read(self, offset, size):
+        self._source.seek(offset)
+        return self._source.read(size)
+
+    @staticmethod
+    def _marker(text):
+        return b'\nfn=' if isinstance(text, bytes) else '\nfn='
+
+    def _block_start(self, offset, start):
+        """Offset of the block holding offset: its fn= line, or start for anything before the first one."""
+        # A block starting right at offset has its marker end 3 units past it
+        stop = offset + 3
+        while True:
+            begin = max(start, stop - self.SEARCH_CHUNK)
+            text = self._read(begin, stop - begin)
+            found = text.rfind(self._marker(text))
+            if found >= 0:
+                return begin + found + 1
+            if begin == start:
+                return start
+            # Overlapping the reads, so a marker across two of them is found
+            stop = begin + 3
+
+    def _block_end(self, offset, end):
+        """Offset of the first block starting after offset, or end."""
+        begin = offset
+        while begin < end:
+            text = self._read(begin, self.SEARCH_CHUNK)
+            found = text.find(self._marker(text))
+            if found >= 0:
+                return begin + found + 1
+            if begin + len(text) >= end:
+                break
+            begin += len(text) - 3
+        return end
+
+    def _parse_block(self, block):
+        """Parse the text of whole blocks, returns the samples found."""
+        if isinstance(block, bytes):
+            block = block.decode('utf-8', 'replace')
+
+        before = self.profile[SAMPLES]
+        self.positions = {}
+        self.last_positions = [0]*self.num_positions
+        self.restart(io.StringIO(block))
+        while not self.eof():
+            if not self.parse_body_line():
+                # Anything else (a totals: line, another part's header) is skipped
+                self.consume()
+
+        return self.profile[SAMPLES] - before
+
+    def _scan_names(self, start):
+        """Record every compressed function name defined after start."""
+        self._source.seek(start)
+        rest = None
+        while True:
+            chunk = self._source.read(self.SCAN_CHUNK)
+            if not chunk:
+                break
+            if rest is not None:
+                chunk = rest + chunk
+            # Hold back the last partial line for the next chunk
+            cut = chunk.rfind(b'\n' if isinstance(chunk, bytes) else '\n') + 1
+            chunk, rest = chunk[:cut], chunk[cut:]
+            if isinstance(chunk, bytes):
+                chunk = chunk.decode('utf-8', 'replace')
+            for id, name in self._name_re.findall(chunk):
+                self.position_ids.setdefault(('fn', id), name)
+
+    def derive(self, phase):
+        if self.estimate['fraction'] >= 1.0:
+            return CallgrindParser.derive(self, phase)
+
+        with phase('validate'):
+            self.profile.validate()
+        with phase('find_cycles'):
+            self.profile.find_cycles()
+        with phase('ratio'):
+            self._sampled_ratios()
+
+    def _sampled_ratios(self):
+        """Time ratios from the sampled blocks, in place of ratio, call_ratios and integrate.
+
+        Totals are taken against the summary in the header when there is one,
+        or else the estimated total.
+        """
+        _partial_ratios(self.profile, self.summary or self.estimate['samples'] or 1.0)
+
+    def parse_cost_summary(self):
+        pair = self.parse_keys(('summary', 'totals'))
+        if pair is None:
+            return False
+        key, value = pair
+        if key == 'summary' and value.split():
+            self.summary = float(value.split()[0])
+        return True
+
+    def unknown_position(self, table, id):
+        return '%s#%s' % (table, id)
+
+
+def _map_file(f):
+    """Read only memory map of a binary file, or empty bytes for an empty file, which mmap refuses."""
+
+    import mmap
+    if os.fstat(f.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CallgrindIndex:
+    """Byte offsets of the function blocks of a callgrind file.
+
+    One pass over the file with a regex matching only position lines (far
+    quicker than parsing) records, for every function, where each of its
+    fn= blocks starts and ends and the ob= and fl= in effect there, along
+    with the compressed name tables and the total cost (from the summary:
+    or totals: lines, or summed from the cost lines when the file has
+    neither, or claims 0). The index is saved
+    next to the file as a hidden sidecar, see `open`, and lets
+    IndexedCallgrindParser parse only the blocks it needs.
+    """
+
+    VERSION = 2
+
+    _line_re = re.compile(
+        br'^(?:(?P<position>[cj]?(?:ob|fl|fi|fe|fn))=[ \t]*(?:\((?P<id>\d+)\))?[ \t]*(?P<name>[^\r\n]*)'
+        br'|(?P<key>summary|totals):[ \t]*(?P<value>[^\r\n]*))',
+        re.M
+    )
+    _positions_re = re.compile(br'^positions:[ \t]*([^\r\n]*)', re.M)
+
+    def __init__(self, size, mtime, body, blocks, tables, total):
+        self.size = size
+        self.mtime = mtime
+        # Offset of the first position line, everything before is the header
+        self.body = body
+        # Function name -> [[start, end, ob, fl], ...]
+        self.blocks = blocks
+        # Table ('ob', 'fl' or 'fn') -> {id: name}
+        self.tables = tables
+        self.total = total
+
+    @staticmethod
+    def sidecar(filename):
+        head, tail = os.path.split(filename)
+        return os.path.join(head, '.%s.index' % tail)
+
+    @classmethod
+    def build(cls, filename):
+        with open(filename, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            data = _map_file(f)
+            try:
+                return cls._scan(data, stat.st_size, stat.st_mtime_ns)
+            finally:
+                if not isinstance(data, bytes):
+                    data.close()
+
+    @classmethod
+    def _scan(cls, data, size, mtime):
+        tables = {'ob': {}, 'fl': {}, 'fn': {}}
+        positions = {}
+        blocks = {}
+        body = None
+        block = None
+        summary = totals = None
+
+        for mo in cls._line_re.finditer(data):
+            position = mo.group('position')
+            if position is None:
+                value = mo.group('value').split()
+                if value:
+                    if mo.group('key') == b'summary':
+                        # One per part
+                        summary = (summary or 0.0) + float(value[0])
+                    else:
+                        totals = (totals or 0.0) + float(value[0])
+                continue
+
+            if body is None:
+                body = mo.start()
+            position = position.decode()
+            name = mo.group('name').decode('utf-8', 'replace') or None
+            id = mo.group('id')
+            if id is not None:
+                table = tables[CallgrindParser._position_table_map[position]]
+                id = id.decode()
+                if name:
+                    table.setdefault(id, name)
+                else:
+                    name = table.get(id, '')
+
+            position = CallgrindParser._position_map[position]
+            if position == 'fn':
+                if block is not None:
+                    block[1] = mo.start()
+                block = [mo.start(), size, positions.get('ob', ''), positions.get('fl', '')]
+                blocks.setdefault(name or '', []).append(block)
+            elif position in ('ob', 'fl'):
+                positions[position] = name or ''
+
+        body = size if body is None else body
+        total = summary or totals or cls._sum_costs(data, body)
+        return cls(size, mtime, body, blocks, tables, total)
+
+    @classmethod
+    def _sum_costs(cls, data, body):
+        """First event summed over the self cost lines.
+
+        That's every cost line's, less those of the lines right after a
+        calls=, which hold the inclusive cost of the call.
+        """
+
+        mo = cls._positions_re.search(data, 0, body)
+        positions = len(mo.group(1).split()) if mo else 1
+        cost = br'[0-9+*-]\S*[ \t]+' + br'(?:\S+[ \t]+)' * (positions - 1) + br'(\d+)'
+
+        lines = re.compile(br'^' + cost, re.M).findall(data, body)
+        calls = re.compile(br'^calls=[^\n]*\n' + cost, re.M).findall(data, body)
+        return float(sum(map(int, lines)) - sum(map(int, calls)))
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({
+                'version': self.VERSION,
+                'size': self.size,
+                'mtime': self.mtime,
+                'body': self.body,
+                'blocks': self.blocks,
+                'tables': self.tables,
+                'total': self.total,
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            data = json.load(f)
+        if data.get('version') != cls.VERSION:
+            return None
+        return cls(data['size'], data['mtime'], data['body'], data['blocks'], data['tables'], data['total'])
+
+    @classmethod
+    def open(cls, filename):
+        """Index of filename, from its sidecar while that's current, or built (and saved) again."""
+
+        stat = os.stat(filename)
+        sidecar = cls.sidecar(filename)
+        try:
+            index = cls.load(sidecar)
+            if index is not None and (index.size, index.mtime) == (stat.st_size, stat.st_mtime_ns):
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+
+        index = cls.build(filename)
+        try:
+            index.save(sidecar)
+        except OSError:
+            # A read only directory only costs the next query another pass
+            pass
+        return index
+
+
+class IndexedCallgrindParser(CallgrindParser):
+    """Callgrind parser reading only the blocks of some functions, through a CallgrindIndex.
+
+    The blocks of the given functions are parsed, then those of their callees,
+    down to `depth` levels of calls, all from a memory map of the file. Ratios
+    are derived as for SampledCallgrindParser: every parsed function's totals
+    are exact (barring recursion), the callees of the last level only get
+    what their parsed callers spent in them.
+    """
+
+    def __init__(self, infile, index, functions, depth=1, stats=None):
+        self._data = _map_file(infile)
+        header = self._data[:index.body].decode('utf-8', 'replace')
+        CallgrindParser.__init__(self, io.StringIO(header), stats)
+        self.index = index
+        self.functions = functions
+        self.depth = depth
+
+    def parse(self):
+        stats = self.stats
+        if stats is None:
+            phase = lambda name: _no_stats_phase
+        else:
+            phase = stats.phase
+
+        try:
+            with phase('read'):
+                self.readline()
+                self.parse_key('version')
+                self.parse_key('creator')
+                while self.parse_header_line():
+                    pass
+
+                for table, ids in compat_iteritems(self.index.tables):
+                    for id, name in compat_iteritems(ids):
+                        self.position_ids[(table, id)] = name
+
+                parsed = set()
+                level = [name for name in self.functions if name in self.index.blocks]
+                for i in range(self.depth + 1):
+                    following = []
+                    for name in level:
+                        if name in parsed:
+                            continue
+                        parsed.add(name)
+                        for block in self.index.blocks.get(name, ()):
+                            self._parse_block(*block)
+                        # A block without any cost lines doesn't define its function
+                        function = self.profile.functions.get(name)
+                        if function is not None:
+                            following.extend(call.callee_id for call in compat_itervalues(function.calls))
+                    level = following
+        finally:
+            if not isinstance(self._data, bytes):
+                self._data.close()
+
+        with phase('validate'):
+            self.profile.validate()
+        with phase('find_cycles'):
+            self.profile.find_cycles()
+        with phase('ratio'):
+            # Never the parsed blocks' own cost, which is only part of the profile
+            _partial_ratios(self.profile, self.index.total or 1.0)
+
+        if stats is not None:
+            stats.finish(self.profile, self.line_no)
+
+        return self.profile
+
+    def _parse_block(self, start, end, ob, fl):
+        self.positions = {'ob': ob, 'fl': fl}
+        self.last_positions = [0]*self.num_positions
+        self.restart(io.StringIO(self._data[start:end].decode('utf-8', 'replace')))
+        while not self.eof():
+            if not self.parse_body_line():
+                # Anything else (a totals: line, another part's header) is skipped
+                self.consume()
+
+    def unknown_position(self, table, id):
+        return '%s#%s' % (table, id)
+
+
+def main(args):
+    """Parse a callgrind file, reporting where the time went.
+
+    usage: gprof2dot.py CALLGRIND_FILE [REPORT_JSON]
+    """
+
+    stats = ParseStats(trace_memory=True)
+    with open(args[1]) as f:
+        CallgrindParser(f, stats).parse()
+    stats.report(sys.stdout)
+    if len(args) > 2:
+        stats.write_json(args[2])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,199 @@
+from dataclasses import dataclass, field
+from gprof2dot import TOTAL_TIME_RATIO, UndefinedEvent
+from typing import Optional
+
+
+@dataclass
+class FunctionInfo:
+    name: str
+    full_name: str
+    time_ratio_all_calls: float = 0
+    total_time_ratio: float = 0
+    is_cycle: bool = False
+
+    def __str__(self) -> str:
+        return (
+            f"Full Name: {self.full_name}<br>"
+            f"Time Spent: {self.total_time_ratio * 100:.02f}%<br>"
+            f"Time Spent All Calls: {self.time_ratio_all_calls * 100:.02f}%<br>"
+        )
+
+
+@dataclass
+class CustomHierarchy:
+    data: FunctionInfo
+    depth: int
+    height: int
+    parent: "CustomHierarchy" = None
+    children: list["CustomHierarchy"] = None
+    # Set when the depth limit cut off this node's callees, so they can be fetched later...
+    truncated: bool = False
+    # Profile and function the node was built from, used to build its callees on demand...
+    source: tuple = field(default=None, repr=False, compare=False)
+
+    @property
+    def value(self) -> float:
+        return self.data.total_time_ratio
+
+    def __iter__(self):
+        if(self.children is not None):
+            for c in self.children:
+                yield from c
+
+        yield self
+
+
+def build_graph(profile, depth_limit = 20) -> CustomHierarchy:
+    # Only builds depth_limit levels, anything deeper is left truncated for expand to fill in when needed. A profile
+    # without any functions (a preview which read nothing, say) gives a lone empty root...
+    if(len(profile.functions) == 0):
+        return CustomHierarchy(FunctionInfo("(empty)", "(empty profile)"), 0, 0)
+
+    root = max(profile.functions.values(), key=lambda a: a.events[TOTAL_TIME_RATIO])
+
+    return _build_graph(profile, root, 0, depth_limit)
+
+def _build_graph(profile, func, depth, depth_limit = 100, parent = None, sub_ratio = 1) -> Optional[CustomHierarchy]:
+    # Create a new node for ourself...
+    data = FunctionInfo(
+        func.stripped_name(),
+        func.name,
+        func.events[TOTAL_TIME_RATIO],
+        sub_ratio
+    )
+
+    new_node = CustomHierarchy(
+        data,
+        depth,
+        0,
+        parent,
+        None
+    )
+
+    if(len(func.calls) == 0):
+        return new_node
+
+    if(depth >= depth_limit):
+        new_node.truncated = True
+        new_node.source = (profile, func)
+        return new_node
+
+    new_node.children = []
+
+    sub_ratio_calls = 0
+
+    for name, callObj in func.calls.items():
+        try:
+            call_time = callObj[TOTAL_TIME_RATIO]
+        except UndefinedEvent:
+            # Recursive, TODO: Change...
+            call_time = sub_ratio * (sub_ratio / (1 if(parent is None or parent.value == 0) else parent.value))
+
+        sub_ratio_calls += call_time
+
+    correction_mult = 1 if(sub_ratio_calls <= sub_ratio) else sub_ratio / sub_ratio_calls
+
+    for name, callObj in func.calls.items():
+        try:
+            call_time = callObj[TOTAL_TIME_RATIO] * correction_mult
+        except UndefinedEvent:
+            # Recursive, TODO: Change...
+            call_time = sub_ratio * (sub_ratio / (1 if(parent is None or parent.value == 0) else parent.value)) * correction_mult
+
+        new_node.children.append(
+            _build_graph(profile, profile.functions[name], depth + 1, depth_limit, new_node, call_time)
+        )
+
+    new_node.height = max(c.height for c in new_node.children) + 1
+
+    return new_node
+
+def compute_sizes(graph: CustomHierarchy, width: int, node_depth: int, offset: float = 0) -> CustomHierarchy:
+    px0, py0, px1, py1 = (
+        (0, 0, width, 0)
+        if(graph.parent is None) else
+        (graph.parent.x0, graph.parent.y0, graph.parent.x1, graph.parent.y1)
+    )
+
+    graph.x0 = px0 + offset
+    graph.y0 = py1
+    if(graph.parent is not None and graph.parent.value == 0):
+        graph.x1 = graph.x0
+    else:
+        if(graph.parent is not None):
+            graph.x1 = graph.x0 + (graph.value / graph.parent.value) * (px1 - px0)
+        else:
+            graph.x1 = graph.x0 + 1
+    graph.y1 = py1 + node_depth
+
+    if(graph.children is None):
+        return
+
+    sub_offset = 0
+
+    for i, c in enumerate(graph.children):
+        compute_sizes(c, width, node_depth, sub_offset)
+        sub_offset = c.x1 - graph.x0
+
+    return graph
+
+
+def expand(node: CustomHierarchy, depth_limit: int) -> CustomHierarchy:
+    # Build the callees of a truncated node down to depth_limit, the result can be grafted onto the node...
+    profile, func = node.source
+    return _build_graph(profile, func, node.depth, depth_limit, node.parent, node.value)
+
+def pending(node: CustomHierarchy, depth_limit: int) -> list[CustomHierarchy]:
+    # Truncated nodes below node (or node itself) that need expanding to show everything above depth_limit...
+    return [n for n in node if(n.truncated and n.depth < depth_limit)]
+
+
+def to_dict(graph: CustomHierarchy) -> dict:
+    # Plain nested dictionaries, so subtrees can be sent as JSON...
+    return {
+        "name": graph.data.name,
+        "full_name": graph.data.full_name,
+        "time_ratio_all_calls": graph.data.time_ratio_all_calls,
+        "total_time_ratio": graph.data.total_time_ratio,
+        "is_cycle": graph.data.is_cycle,
+        "truncated": graph.truncated,
+        "children": None if(graph.children is None) else [to_dict(c) for c in graph.children]
+    }
+
+def from_dict(data: dict, depth: int = 0, parent: CustomHierarchy = None) -> CustomHierarchy:
+    new_node = CustomHierarchy(
+        FunctionInfo(
+            data["name"],
+            data["full_name"],
+            data["time_ratio_all_calls"],
+            data["total_time_ratio"],
+            data["is_cycle"]
+        ),
+        depth,
+        0,
+        parent,
+        None,
+        data["truncated"]
+    )
+
+    if(data["children"] is not None):
+        new_node.children = [from_dict(c, depth + 1, new_node) for c in data["children"]]
+        new_node.height = max(c.height for c in new_node.children) + 1
+
+    return new_node
+
+def graft(node: CustomHierarchy, subtree: CustomHierarchy):
+    # Replace a truncated node's callees with those of a fetched subtree rooted at the same function...
+    node.children = subtree.children
+    node.truncated = subtree.truncated
+    node.height = subtree.height
+
+    if(node.children is not None):
+        for c in node.children:
+            c.parent = node
+
+    parent = node.parent
+
+    while(parent is not None):
+        parent.height = max(c.height for c in parent.children) + 1
+        parent = parent.parent
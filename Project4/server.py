@@ -0,0 +1,185 @@
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
+from gprof2dot import CallgrindIndex, CallgrindParser, IndexedCallgrindParser, Profile, SampledCallgrindParser
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from icicle import build_graph, _build_graph, to_dict
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs, unquote
+import json
+import sys
+import threading
+
+# Number of parsed profiles kept in memory at once...
+CACHE_SIZE = 8
+# Levels of the icicle returned per request when no depth is given...
+DEFAULT_DEPTH = 6
+MAX_DEPTH = 50
+# Share of a profile read for its preview, see SampledCallgrindParser...
+PREVIEW_FRACTION = 0.02
+
+
+class ProfileStore:
+    def __init__(self, data_dir: Path, cache_size: int = CACHE_SIZE):
+        self.data_dir = data_dir
+        self.cache_size = cache_size
+        # Full parses, as futures keyed on path and modification time (so a rewritten file is parsed again instead of
+        # served stale), least recently used first. They run one at a time in the background, so a preview can be
+        # served while the full profile is still being parsed...
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._preview = lru_cache(maxsize=cache_size)(self._sample)
+        self._index = lru_cache(maxsize=cache_size)(self._open_index)
+
+    def ids(self) -> list[str]:
+        return sorted(p.name for p in self.data_dir.glob("callgrind.out.*"))
+
+    def _path(self, profile_id: str) -> Path:
+        if(profile_id not in self.ids()):
+            raise KeyError(profile_id)
+        return self.data_dir / profile_id
+
+    def _load(self, path: Path) -> Future:
+        # Future of the full parse of path, started if it isn't cached already...
+        key = (path, path.stat().st_mtime_ns)
+        with self._lock:
+            future = self._profiles.get(key)
+            if(future is None):
+                future = self._profiles[key] = self._pool.submit(self._parse, *key)
+                while(len(self._profiles) > self.cache_size):
+                    self._profiles.popitem(last=False)
+            self._profiles.move_to_end(key)
+        return future
+
+    def get(self, profile_id: str) -> Profile:
+        return self._load(self._path(profile_id)).result()
+
+    def preview(self, profile_id: str, root: str = None, depth: int = DEFAULT_DEPTH) -> tuple[Profile, dict]:
+        # Returns (profile, estimate), from a sample of the file while its full parse is running (which this starts),
+        # the full profile and None once that's done. With a root, only the blocks of root and its callees (down to
+        # depth) are parsed, found through the file's block index, which makes the subtree exact right away...
+        path = self._path(profile_id)
+        future = self._load(path)
+        if(future.done()):
+            return future.result(), None
+        if(root is not None):
+            return self._subtree_profile(path, root, depth), None
+        return self._preview(path, path.stat().st_mtime_ns)
+
+    def cache_info(self) -> dict:
+        with self._lock:
+            parsed = sum(f.done() for f in self._profiles.values())
+        return {"parsed": parsed, "parsing": len(self._profiles) - parsed, "previews": self._preview.cache_info()}
+
+    @staticmethod
+    def _parse(path: Path, mtime: int) -> Profile:
+        print(f"Parsing: {path}")
+        with open(path) as f:
+            return CallgrindParser(f).parse()
+
+    @staticmethod
+    def _sample(path: Path, mtime: int) -> tuple[Profile, dict]:
+        print(f"Sampling: {path}")
+        with open(path, "rb") as f:
+            parser = SampledCallgrindParser(f, PREVIEW_FRACTION)
+            profile = parser.parse()
+        return profile, parser.estimate
+
+    @staticmethod
+    def _open_index(path: Path, mtime: int) -> CallgrindIndex:
+        return CallgrindIndex.open(str(path))
+
+    def _subtree_profile(self, path: Path, root: str, depth: int) -> Profile:
+        index = self._index(path, path.stat().st_mtime_ns)
+        if(root not in index.blocks):
+            raise KeyError(root)
+        with open(path, "rb") as f:
+            return IndexedCallgrindParser(f, index, [root], depth).parse()
+
+    def subtree(
+        self, profile_id: str, root: str = None, depth: int = DEFAULT_DEPTH, ratio: float = 1, preview: bool = False
+    ) -> dict:
+        # With preview, the subtree comes from the sampled profile until the full one is parsed. The root node then
+        # says whether it's exact ("complete") and, when it isn't, carries the sample's estimate of the total cost...
+        estimate = None
+        if(preview):
+            profile, estimate = self.preview(profile_id, root, depth)
+        else:
+            profile = self.get(profile_id)
+
+        if(root is None):
+            data = to_dict(build_graph(profile, depth))
+        else:
+            data = to_dict(_build_graph(profile, profile.functions[root], 0, depth, None, ratio))
+
+        if(preview):
+            # Files small enough to be sampled whole are exact already...
+            data["complete"] = estimate is None or estimate["fraction"] >= 1
+            data["estimate"] = estimate
+        return data
+
+
+class ProfileHandler(SimpleHTTPRequestHandler):
+    # Serves the page's static files, plus the profile api:
+    #   /profile/                                  List of profile ids.
+    #   /profile/<id>/subtree?root=fn&depth=N      Icicle subtree (hottest function when root is omitted).
+    #   /profile/<id>/subtree?preview=1            Same, from a sample of the profile while it's still being parsed
+    #                                              (or from just root's blocks, through the profile's index, with root).
+    def __init__(self, *args, store: ProfileStore, **kwargs):
+        self.store = store
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if(p != "")]
+
+        if(len(parts) == 0 or parts[0] != "profile"):
+            return super().do_GET()
+
+        try:
+            if(len(parts) == 1):
+                return self.send_json(self.store.ids())
+
+            if(len(parts) == 3 and parts[2] == "subtree"):
+                query = parse_qs(url.query)
+                root = query.get("root", [None])[0]
+                depth = min(int(query.get("depth", [DEFAULT_DEPTH])[0]), MAX_DEPTH)
+                ratio = float(query.get("ratio", [1])[0])
+                if(depth < 1):
+                    raise ValueError(f"depth must be at least 1, got {depth}")
+                # Also turns away nan and inf...
+                if(not 0 < ratio < float("inf")):
+                    raise ValueError(f"ratio must be a positive number, got {ratio}")
+                preview = query.get("preview", ["0"])[0] == "1"
+                return self.send_json(self.store.subtree(parts[1], root, depth, ratio, preview))
+        except KeyError as e:
+            return self.send_error(404, f"Unknown profile or function: {e}")
+        except ValueError as e:
+            return self.send_error(400, f"Bad query: {e}")
+
+        self.send_error(404)
+
+    def send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(args):
+    this_dir = Path(args[0]).resolve().parent
+    port = int(args[1]) if(len(args) > 1) else 8000
+
+    store = ProfileStore(this_dir / "data")
+    handler = partial(ProfileHandler, store=store, directory=str(this_dir))
+
+    with ThreadingHTTPServer(("localhost", port), handler) as server:
+        print(f"Serving profiles on http://localhost:{port}/index.html")
+        server.serve_forever()
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
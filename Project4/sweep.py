@@ -0,0 +1,123 @@
+from concurrent.futures import ProcessPoolExecutor
+from gprof2dot import CallgrindParser, TOTAL_TIME_RATIO, TIME_RATIO
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import re
+import sys
+
+# Pulls the swept parameter out of the end of a callgrind file name, e.g. "callgrind.out.134422.switchsize2"
+# gives ("switchsize", 2)...
+PARAM_RE = re.compile(r"(?P<name>[A-Za-z_]+?)(?P<value>\d+(?:\.\d+)?)$")
+
+# Number of functions (ranked by peak total time) kept in the final sweep asset...
+TOP_FUNCTIONS = 25
+
+
+def parse_param(path: Path) -> tuple[str, float]:
+    mo = PARAM_RE.search(path.name)
+    if(mo is None):
+        raise ValueError(f"No sweep parameter in file name: {path.name}")
+    value = float(mo.group("value"))
+    return mo.group("name"), (int(value) if(value.is_integer()) else value)
+
+
+def summarize(path: Path) -> dict:
+    # Runs in a worker process, so only return plain data...
+    with open(path) as f:
+        profile = CallgrindParser(f).parse()
+
+    return {
+        func.name: [func[TOTAL_TIME_RATIO], func[TIME_RATIO], func.stripped_name()]
+        for func in profile.functions.values()
+    }
+
+
+def load_summaries(
+    paths: list[Path], cache_dir: Path, max_workers: int = None, force: bool = False
+) -> dict[Path, dict]:
+    cache_dir.mkdir(exist_ok=True)
+
+    summaries = {}
+    to_parse = {}
+
+    # Cache is keyed by file content, so renamed or touched files don't trigger a re-parse...
+    for path in paths:
+        cache_file = cache_dir / (hashlib.sha1(path.read_bytes()).hexdigest() + ".json")
+        if(not force and cache_file.exists()):
+            with open(cache_file) as f:
+                summaries[path] = json.load(f)
+        else:
+            to_parse[path] = cache_file
+
+    if(len(to_parse) > 0):
+        with ProcessPoolExecutor(max_workers) as pool:
+            for (path, cache_file), summary in zip(to_parse.items(), pool.map(summarize, to_parse)):
+                print(f"Parsed: {path}")
+                with open(cache_file, "w") as f:
+                    json.dump(summary, f)
+                summaries[path] = summary
+
+    return summaries
+
+
+def build_sweep(summaries: dict[Path, dict], top: int = TOP_FUNCTIONS) -> dict:
+    points = sorted((parse_param(path), path) for path in summaries)
+    names = {name for (name, value), path in points}
+    if(len(names) > 1):
+        raise ValueError(f"Files sweep over more than one parameter: {sorted(names)}")
+
+    functions = {}
+
+    for i, (param, path) in enumerate(points):
+        for full_name, (total, self_time, name) in summaries[path].items():
+            if(full_name not in functions):
+                functions[full_name] = {
+                    "name": name,
+                    "full_name": full_name,
+                    "total": [0] * len(points),
+                    "self": [0] * len(points)
+                }
+            functions[full_name]["total"][i] = total
+            functions[full_name]["self"][i] = self_time
+
+    for func in functions.values():
+        # Change in share from the smallest to the largest parameter value, positive means it grows...
+        func["growth"] = func["total"][-1] - func["total"][0]
+
+    # Keep the hottest functions, ordered by how much their share grows with the parameter...
+    kept = sorted(functions.values(), key=lambda f: max(f["total"]), reverse=True)[:top]
+    kept.sort(key=lambda f: f["growth"], reverse=True)
+
+    return {
+        "parameter": points[0][0][0],
+        "values": [value for (name, value), path in points],
+        "files": [path.name for param, path in points],
+        "functions": kept
+    }
+
+
+def main(args):
+    this_dir = Path(args[0]).resolve().parent
+    data_dir = this_dir / "data"
+
+    parser = argparse.ArgumentParser(description="Summarize a parameter sweep of callgrind profiles into sweep.json.")
+    parser.add_argument("profiles", nargs="*", help="Profiles of the sweep (default: every callgrind.out.* in data)")
+    parser.add_argument("--force", action="store_true", help="Parse every profile again, even the cached ones")
+    opts = parser.parse_args(args[1:])
+
+    paths = [Path(p).resolve() for p in opts.profiles]
+    if(len(paths) == 0):
+        paths = sorted(data_dir.glob("callgrind.out.*"))
+
+    summaries = load_summaries(paths, data_dir / ".sweep_cache", force=opts.force)
+    sweep = build_sweep(summaries)
+
+    print(f"Saving sweep over '{sweep['parameter']}': {sweep['values']}")
+    with open(data_dir / "sweep.json", "w") as f:
+        json.dump(sweep, f)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -0,0 +1,137 @@
+from pathlib import Path
+import random
+import sys
+
+def inclusive_costs(costs: list[list[int]], calls: list[list[tuple[int, int]]]) -> list[list[int]]:
+    # Inclusive cost of every call, given each function's self costs and (callee, count) calls. A function's inclusive
+    # cost (its own plus that of its calls) is split between its callers by call count. As in valgrind's output a
+    # recursive call isn't part of its caller's cost (its cost lines already count every invocation), and a call that
+    # closes a cycle, which would never end if counted in full, costs one pass through the callee's own cost lines.
+    # Functions are done in depth first post order, callees before callers, without recursing...
+    called = [0] * len(costs)
+    for i, callees in enumerate(calls):
+        for c, count in callees:
+            if(c != i):
+                called[c] += count
+
+    inclusive = [None] * len(costs)
+    on_stack = [False] * len(costs)
+    call_costs = [None] * len(costs)
+
+    for start in range(len(costs)):
+        if(inclusive[start] is not None):
+            continue
+        stack = [(start, iter(calls[start]))]
+        on_stack[start] = True
+
+        while(len(stack) > 0):
+            i, callees = stack[-1]
+            c = next((c for c, count in callees if(c != i and inclusive[c] is None and not on_stack[c])), None)
+            if(c is not None):
+                stack.append((c, iter(calls[c])))
+                on_stack[c] = True
+                continue
+
+            stack.pop()
+            on_stack[i] = False
+            call_costs[i] = [
+                sum(costs[c]) if(c == i or inclusive[c] is None) else round(inclusive[c] * count / called[c])
+                for c, count in calls[i]
+            ]
+            inclusive[i] = sum(costs[i]) + sum(cost for (c, count), cost in zip(calls[i], call_costs[i]) if(c != i))
+
+    return call_costs
+
+
+def generate(
+    functions: int = 500,
+    fanout: int = 3,
+    recursion: float = 0.05,
+    cycles: float = 0.02,
+    cost_lines: int = 4,
+    size: int = None,
+    seed: int = 0
+) -> str:
+    # Synthetic callgrind profile. Function 0 is the entry point and functions form a tree where each calls `fanout`
+    # others (keeping the call depth logarithmic), `recursion` is the chance a function also calls itself, and `cycles`
+    # is the chance of each call instead going back up to an earlier function (forming a cycle). When size (in bytes)
+    # is given, cost lines are padded out until the file is roughly that big.
+    if(size is not None):
+        base = len(generate(functions, fanout, recursion, cycles, 1, None, seed))
+        per_line = len(generate(functions, fanout, recursion, cycles, 2, None, seed)) - base
+        extra = max(0, size - base) // max(per_line, 1)
+        return generate(functions, fanout, recursion, cycles, 1 + extra, None, seed)
+
+    rng = random.Random(seed)
+    lines = [
+        "# callgrind format",
+        "version: 1",
+        "creator: synthetic",
+        "cmd: ./synthetic",
+        "part: 1",
+        "",
+        "positions: line",
+        "events: Ir",
+        ""
+    ]
+
+    named = set()
+
+    def fn_name(i):
+        # Use name compression like valgrind, full name on first use then just the id...
+        if(i in named):
+            return f"({i + 1})"
+        named.add(i)
+        return f"({i + 1}) func_{i}(int, double*)"
+
+    # Costs are drawn up front, so each call's inclusive cost can be worked out from what its callee spends...
+    costs = []
+    calls = []
+    for i in range(functions):
+        costs.append([rng.randint(1, 10000) for j in range(cost_lines)])
+
+        callees = list(range(i * fanout + 1, min((i + 1) * fanout + 1, functions)))
+        if(rng.random() < recursion):
+            callees.append(i)
+        if(i > 0):
+            callees = [rng.randrange(0, i) if(rng.random() < cycles) else c for c in callees]
+        calls.append([(c, rng.randint(1, 1000)) for c in callees])
+
+    call_costs = inclusive_costs(costs, calls)
+
+    lines.append("ob=(1) ./synthetic")
+    lines.append("fl=(1) synthetic.cpp")
+
+    for i in range(functions):
+        lines.append(f"fn={fn_name(i)}")
+        line_no = 10 * i + 1
+
+        for j, cost in enumerate(costs[i]):
+            lines.append(f"{line_no + j} {cost}")
+
+        for (c, count), cost in zip(calls[i], call_costs[i]):
+            lines.append(f"cfn={fn_name(c)}")
+            lines.append(f"calls={count} {10 * c + 1}")
+            lines.append(f"{line_no} {cost}")
+
+        lines.append("")
+
+    # Like valgrind, the total is the sum of every self cost (call lines are inclusive, so they'd count twice)...
+    lines.append(f"totals: {sum(sum(c) for c in costs)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def main(args):
+    # usage: synthetic.py OUTPUT [FUNCTIONS] [FANOUT] [RECURSION] [CYCLES] [SIZE]
+    out = Path(args[1])
+    params = [int, int, float, float, int]
+    values = [conv(a) for conv, a in zip(params, args[2:])]
+    names = ["functions", "fanout", "recursion", "cycles", "size"]
+
+    with open(out, "w") as f:
+        f.write(generate(**dict(zip(names, values))))
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
@@ -58,9 +58,58 @@ function charToNumber(char) {
 }
 
 
+// Layout version of data/frequencies.json written by data/ingest.py, anything else falls back to the upstream file...
+const FREQUENCIES_VERSION = 2;
+const UPSTREAM_URL = "https://raw.githubusercontent.com/hodcroftlab/covariants/master/cluster_tables/EUClusters_data.json";
+
+// Fill of a country in a week it has no sequences for...
+const NO_DATA_COLOR = "#f5e6cb";
+
+// Precomputed variant shares (percent of sequences) of each country's data object, when loaded from the asset...
+const SHARES = new WeakMap();
+
 async function getFrequencies() {
-    let data = await d3.json("https://raw.githubusercontent.com/hodcroftlab/covariants/master/cluster_tables/EUClusters_data.json");
+    let data = await d3.json("data/frequencies.json").catch(() => null);
+
+    let cumulative = (data != null)? await d3.buffer("data/" + data.index.file).catch(() => null): null;
+
+    if(data == null || data.version !== FREQUENCIES_VERSION || cumulative == null) {
+        // Said on the page, so a deploy missing the asset doesn't go unnoticed behind a slow load...
+        let reason = (data == null)? "missing": (data.version !== FREQUENCIES_VERSION)? "out of date": "missing its index";
+        d3.select("#notice")
+            .style("display", null)
+            .text(
+                `The precomputed data (data/frequencies.json) is ${reason}, so the whole upstream table is being ` +
+                "downloaded and aggregated in the browser instead, which can take a while. Running data/ingest.py " +
+                "--fetch builds it."
+            );
+        console.warn(`data/frequencies.json is ${reason}, falling back to ${UPSTREAM_URL}`);
+        return computeFrequencies(await d3.json(UPSTREAM_URL));
+    }
+
+    // Running sums of the (country x week x variant) counts, see time_index in data/ingest.py...
+    data.index.cumulative = new Int32Array(cumulative);
+    data.index.position = Object.fromEntries(data.index.countries.map((name, i) => [name, i]));
+
+    // Everything is already aggregated, only the dates need parsing...
+    for(let countryName in data.countries) {
+        let country = data.countries[countryName];
+        country.week = country.week.map(TO_TIME);
 
+        let shares = {};
+        for(let variant in data.shares[countryName]) {
+            shares[variant] = data.shares[countryName][variant].map((v) => v / data.share_scale);
+        }
+        SHARES.set(country, shares);
+    }
+    data.totals.week = data.totals.week.map(TO_TIME);
+    for(let elem in data.plotting_dates) data.plotting_dates[elem] = TO_TIME(data.plotting_dates[elem]);
+
+    return data;
+}
+
+function computeFrequencies(data) {
+    // Same aggregation as data/ingest.py, for when there's no precomputed asset...
     let totals = {};
 
     for(let countryName in data.countries) {
@@ -115,12 +164,31 @@ function grabCountryDataForTime(data, country, date, keepTotal = true) {
     return newList;
 }
 
+function windowCounts(index, country, start, end) {
+    // Counts of each variant over the weeks [start, end) of a country, from two rows of the running sums...
+    let variants = index.variants.length;
+    let row = index.position[country] * (index.weeks + 1);
+    let [a, b] = [(row + start) * variants, (row + end) * variants];
+
+    return index.variants.map((variant, i) => {
+        return {"variant": variant, "count": index.cumulative[b + i] - index.cumulative[a + i]};
+    });
+}
+
+function countsAtWeek(data, country, weekIndex) {
+    // Variant counts of a country in the week at weekIndex of data.totals.week...
+    if(data.index != null) return windowCounts(data.index, country, weekIndex, weekIndex + 1);
+    return grabCountryDataForTime(data, country, data.totals.week[weekIndex], false);
+}
+
 function toDataList(data) {
     let covidVariants = Object.keys(data).filter((v) => (
         v !== "total_sequences" && v !== "week" && v !== "Other"
     ));
     covidVariants.push("Other");
 
+    let shares = SHARES.get(data);
+
     return [data.week.map((d, i) => {
         let newData = {};
 
@@ -128,7 +196,9 @@ function toDataList(data) {
             newData[key] = data[key][i];
         }
 
-        for(let variant of covidVariants) newData[variant] /= (data.total_sequences[i] / 100);
+        for(let variant of covidVariants) {
+            newData[variant] = (shares !== undefined)? shares[variant][i]: newData[variant] / (data.total_sequences[i] / 100);
+        }
 
         return newData;
     }), covidVariants];
@@ -382,7 +452,7 @@ async function updateWorldPlot(worldPlot, data, world, sliderIndex = 0) {
             tooltip.style("display", "block");
             let table = d3.create("table");
 
-            let subData = grabCountryDataForTime(data, d.properties.name, data.totals.week[sliderIndex], false);
+            let subData = countsAtWeek(data, d.properties.name, sliderIndex);
             table.html("<caption>" + d.properties.name + "</caption><tr><th>Variant</th><th>Count</th></tr>");
 
             subData.sort((a, b) => b.count - a.count).filter((d2) => d2.count > 0).forEach((d2) => {
@@ -396,14 +466,29 @@ async function updateWorldPlot(worldPlot, data, world, sliderIndex = 0) {
             if(SELECTED_COUNTRY.name !== d.properties.name) elem.attr("stroke", "white");
         });
 
-    worldPlot.worldData.each(function (d) {
-        if(d.properties.name in data.countries) {
-            let countryData = grabCountryDataForTime(data, d.properties.name, data.totals.week[sliderIndex], false);
-            let maxLoc = {"count": -Infinity}
-            for(let variant of countryData) if(variant.count > maxLoc.count) maxLoc = variant;
-            d3.select(this).transition(200).attr("fill", colorMap(maxLoc.variant));
-        }
-    });
+    if(data.index != null) {
+        // Most common variants are precomputed, recoloring is only a lookup per country...
+        let colors = data.index.variants.map((v) => colorMap(v));
+        let position = data.index.position;
+        let dominant = data.index.dominant;
+
+        worldPlot.worldData.each(function (d) {
+            if(d.properties.name in position) {
+                let v = dominant[d.properties.name][sliderIndex];
+                d3.select(this).transition(200).attr("fill", (v >= 0)? colors[v]: NO_DATA_COLOR);
+            }
+        });
+    }
+    else {
+        worldPlot.worldData.each(function (d) {
+            if(d.properties.name in data.countries) {
+                let countryData = grabCountryDataForTime(data, d.properties.name, data.totals.week[sliderIndex], false);
+                let maxLoc = {"count": -Infinity}
+                for(let variant of countryData) if(variant.count > maxLoc.count) maxLoc = variant;
+                d3.select(this).transition(200).attr("fill", colorMap(maxLoc.variant));
+            }
+        });
+    }
 
     worldPlot.worldData.on("click", (evt, d) => {
         if(!(d.properties.name in data.countries)) return;
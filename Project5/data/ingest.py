@@ -0,0 +1,208 @@
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import sys
+import urllib.error
+import urllib.request
+
+UPSTREAM_URL = "https://raw.githubusercontent.com/hodcroftlab/covariants/master/cluster_tables/EUClusters_data.json"
+SOURCE_NAME = "EUClusters_data.json"
+# A few countries and weeks in the upstream layout, for running this without the network (with --out somewhere else,
+# so the page never shows it)...
+FIXTURE_NAME = "EUClusters_fixture.json"
+ASSET_NAME = "frequencies.json"
+INDEX_NAME = "frequencies_index.bin"
+
+# Bump when the layout of frequencies.json changes, charts.js checks it and falls back to computing everything itself
+# when it doesn't match...
+FORMAT_VERSION = 2
+
+# Per-country shares are stored as integers in units of 1 / SHARE_SCALE percent, which keeps them short in the json...
+SHARE_SCALE = 100
+
+
+def fetch(url: str, path: Path, etag: str = None) -> str:
+    # Download url to path unless the server says our copy (with the given ETag) is still current. Returns the ETag
+    # of what's now on disk...
+    headers = {"If-None-Match": etag} if(etag is not None and path.exists()) else {}
+    request = urllib.request.Request(url, headers=headers)
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            path.write_bytes(response.read())
+            print(f"Downloaded: {url}")
+            return response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if(e.code == 304):
+            print("Upstream unchanged.")
+            return etag
+        raise
+
+
+def to_frame(countries: dict) -> tuple[pd.DataFrame, dict[str, list[str]]]:
+    # One row per (country, week), one column per variant (0 where a country doesn't report it), plus the variants each
+    # country actually has so they can be written back the same way...
+    import numpy as np
+    import pandas as pd
+
+    frames = []
+    present = {}
+
+    for name, country in countries.items():
+        frame = pd.DataFrame(country)
+        frame.insert(0, "country", name)
+        frames.append(frame)
+        present[name] = [key for key in country if(key not in ("week", "total_sequences"))]
+
+    data = pd.concat(frames, ignore_index=True)
+    variants = [c for c in data.columns if(c not in ("country", "week", "total_sequences"))]
+    data[variants] = data[variants].fillna(0).astype(np.int64)
+
+    return data, present
+
+
+def aggregate(source: dict) -> tuple[dict, np.ndarray]:
+    import numpy as np
+    import pandas as pd
+
+    data, present = to_frame(source["countries"])
+    variants = [c for c in data.columns if(c not in ("country", "week", "total_sequences"))]
+
+    # Sequences not assigned to any variant, for every row at once...
+    data["Other"] = data["total_sequences"] - data[variants].sum(axis=1)
+    counted = variants + ["Other"]
+
+    # Worldwide totals per week (in date order, the weeks are ISO dates)...
+    totals = data.groupby("week", sort=True)[["total_sequences", *counted]].sum()
+
+    # Percent of each week's sequences per variant, weeks without sequences are 0...
+    total = data["total_sequences"].to_numpy(dtype=np.float64)[:, None]
+    counts = data[counted].to_numpy(dtype=np.float64)
+    shares = np.divide(counts * 100 * SHARE_SCALE, total, out=np.zeros(counts.shape), where=total > 0)
+    shares = pd.DataFrame(np.round(shares).astype(np.int64), columns=counted)
+
+    countries = {}
+    country_shares = {}
+    for name, rows in data.groupby("country", sort=False):
+        keys = ["total_sequences", *present[name], "Other"]
+        countries[name] = {"week": rows["week"].tolist(), **{key: rows[key].tolist() for key in keys}}
+        country_shares[name] = {key: shares.loc[rows.index, key].tolist() for key in [*present[name], "Other"]}
+
+    cumulative, index = time_index(data, totals.index.tolist(), counted)
+
+    return {
+        "share_scale": SHARE_SCALE,
+        "countries": countries,
+        "totals": {"week": totals.index.tolist(), **{key: totals[key].tolist() for key in totals.columns}},
+        "shares": country_shares,
+        "plotting_dates": source.get("plotting_dates", {}),
+        "index": index
+    }, cumulative
+
+
+def time_index(data: pd.DataFrame, weeks: list[str], counted: list[str]) -> tuple[np.ndarray, dict]:
+    # Dense (country x week x variant) counts on the shared week axis of the totals (weeks a country doesn't report
+    # are 0), stored as running sums over the weeks with a leading row of zeros. The counts of any window of weeks
+    # [a, b) are then cumulative[c, b] - cumulative[c, a], whatever its length. Also returns the index's metadata,
+    # including the position in counted of each country's most common variant per week (-1 for weeks without
+    # sequences), so moving the slider is only a lookup...
+    import numpy as np
+    import pandas as pd
+
+    names = data["country"].unique().tolist()
+    country = pd.Categorical(data["country"], categories=names).codes
+    week = pd.Categorical(data["week"], categories=weeks).codes
+
+    counts = np.zeros((len(names), len(weeks), len(counted)), dtype=np.int64)
+    counts[country, week] = data[counted].to_numpy()
+
+    cumulative = np.zeros((len(names), len(weeks) + 1, len(counted)), dtype=np.int64)
+    np.cumsum(counts, axis=1, out=cumulative[:, 1:])
+    if(np.abs(cumulative).max(initial=0) > np.iinfo(np.int32).max):
+        raise ValueError("Counts don't fit the 32 bit index")
+
+    # Ties go to the first variant in counted, which is also the legend's order...
+    dominant = np.argmax(counts, axis=2)
+    dominant[counts.sum(axis=2) == 0] = -1
+
+    return cumulative.astype("<i4"), {
+        "file": INDEX_NAME,
+        "countries": names,
+        "variants": counted,
+        "weeks": len(weeks),
+        "dominant": {name: row.tolist() for name, row in zip(names, dominant)}
+    }
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def main(args):
+    this_dir = Path(args[0]).resolve().parent
+
+    parser = argparse.ArgumentParser(description="Precompute the variant frequencies used by the dashboard.")
+    parser.add_argument(
+        "source", nargs="?", default=str(this_dir / SOURCE_NAME),
+        help=f"Local copy of the upstream cluster table (default: {SOURCE_NAME} in this directory)"
+    )
+    parser.add_argument("--fetch", action="store_true", help=f"Refresh the local copy from {UPSTREAM_URL} first")
+    parser.add_argument("--force", action="store_true", help="Aggregate even if the asset is up to date")
+    parser.add_argument(
+        "--out", default=str(this_dir), help="Directory the asset and its index are written to (default: this directory)"
+    )
+    opts = parser.parse_args(args[1:])
+
+    source_path = Path(opts.source)
+    out_dir = Path(opts.out)
+    asset_path = out_dir / ASSET_NAME
+    index_path = out_dir / INDEX_NAME
+
+    if(not opts.fetch and not source_path.exists()):
+        sys.exit(
+            f"No source at {source_path}, download it with --fetch, or try the fixture with: "
+            f"ingest.py {FIXTURE_NAME} --out <directory>"
+        )
+
+    previous = {}
+    if(asset_path.exists()):
+        with open(asset_path) as f:
+            previous = json.load(f)
+
+    etag = previous.get("etag")
+    if(opts.fetch):
+        etag = fetch(UPSTREAM_URL, source_path, etag)
+
+    source_hash = file_hash(source_path)
+    script_hash = file_hash(Path(__file__))
+    current = all(
+        previous.get(key) == value
+        for key, value in [("version", FORMAT_VERSION), ("source_sha1", source_hash), ("script_sha1", script_hash)]
+    )
+    if(not opts.force and current and index_path.exists()):
+        print("Frequencies up to date.")
+        return
+
+    with open(source_path) as f:
+        source = json.load(f)
+
+    frequencies, cumulative = aggregate(source)
+    asset = {
+        "version": FORMAT_VERSION, "source_sha1": source_hash, "script_sha1": script_hash, "etag": etag, **frequencies
+    }
+
+    # Written first, so an asset is never newer than its index...
+    cumulative.tofile(index_path)
+
+    with open(asset_path, "w") as f:
+        json.dump(asset, f, separators=(",", ":"))
+
+    size = asset_path.stat().st_size / 2 ** 20
+    print(f"Wrote {len(asset['countries'])} countries, {len(asset['totals']['week'])} weeks ({size:.2f} MB)")
+    print(f"Wrote {INDEX_NAME}: {' x '.join(map(str, cumulative.shape))} ({index_path.stat().st_size / 2 ** 20:.2f} MB)")
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
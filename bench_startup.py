@@ -0,0 +1,93 @@
+from pathlib import Path
+from tempfile import TemporaryDirectory
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+# Number of cold starts of each case, the minimum and median are reported...
+REPEATS = 5
+
+# Runs a script after importing numpy and pandas up front, the way every prep script used to start...
+EAGER = (
+    "import sys, runpy, numpy, pandas; sys.argv = sys.argv[1:]; sys.path.insert(0, sys.path[0] or '.'); "
+    "runpy.run_path(sys.argv[0], run_name='__main__')"
+)
+
+
+def start_times(command: list[str], cwd: Path, repeats: int = REPEATS) -> list[float]:
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def import_report(command: list[str], cwd: Path) -> tuple[float, bool]:
+    # (total import time in ms, whether pandas got imported) from python's -X importtime output...
+    result = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]], cwd=cwd, check=True,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+
+    total = 0
+    pandas = False
+    for line in result.stderr.splitlines():
+        if(not line.startswith("import time:") or "self [us]" in line):
+            continue
+        self_us, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        total += int(self_us)
+        pandas |= name == "pandas"
+
+    return total / 1000, pandas
+
+
+def compare(label: str, script: Path, cwd: Path):
+    lazy = [sys.executable, script.name]
+    eager = [sys.executable, "-c", EAGER, script.name]
+
+    for kind, command in [("eager", eager), ("lazy", lazy)]:
+        times = start_times(command, cwd)
+        imports, pandas = import_report(command, cwd)
+        print(
+            f"{label:<30} {kind:<6} {min(times) * 1000:8.1f} ms {statistics.median(times) * 1000:8.1f} ms "
+            f"{imports:9.1f} ms  {'yes' if(pandas) else 'no'}"
+        )
+
+
+def main(args):
+    # Cold start of each prep script when it has nothing to do, against the same run with numpy and pandas imported
+    # first. Scripts run in place, so build.py should have brought everything up to date first...
+    root = Path(args[0]).resolve().parent
+
+    print(f"{'script':<30} {'':<6} {'min':>11} {'median':>11} {'imports':>12}  pandas")
+
+    bare = [sys.executable, "-c", "pass"]
+    times = start_times(bare, root)
+    print(f"{'(bare interpreter)':<30} {'':<6} {min(times) * 1000:8.1f} ms {statistics.median(times) * 1000:8.1f} ms")
+
+    for script in [
+        "Project1/data/extract_data.py", "Project1/data/aggregate.py", "Project2/data/conv.py",
+        "Project2/data/metrics.py", "Project2/data/downsample.py", "Project3/data/geo_prep.py",
+        "Project3/data/polis_build.py", "Project3/data/polis_index.py"
+    ]:
+        compare(script, root / script, (root / script).parent)
+
+    # merge_sheets has nothing to do without workbooks, which the repo doesn't have (the one workbook in its directory
+    # is extract_data's), so it runs from an empty copy...
+    with TemporaryDirectory() as tmp:
+        for name in ["merge_sheets.py", "sheet_cache.py"]:
+            shutil.copy(root / "Project1/data" / name, tmp)
+        compare("Project1/data/merge_sheets.py", Path(tmp) / "merge_sheets.py", Path(tmp))
+
+    ingest_dir = root / "Project5/data"
+    if((ingest_dir / "frequencies.json").exists() and (ingest_dir / "EUClusters_data.json").exists()):
+        compare("Project5/data/ingest.py", ingest_dir / "ingest.py", ingest_dir)
+    else:
+        print("Project5/data/ingest.py        skipped, run it once first")
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)
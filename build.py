@@ -0,0 +1,283 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from fnmatch import fnmatch
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Content hashes of every stage's inputs and outputs as of its last successful run, a stage only runs again when one
+# of them changed (or an output went missing)...
+MANIFEST_NAME = ".build_manifest.json"
+
+# Every data prep script of the site. Paths are globs relative to the repo root, scripts are run from their own
+# directory (they find their files through sys.argv[0]). A stage runs after every stage producing one of its inputs,
+# anything else runs in parallel. Stages with default set to False only run when named on the command line...
+STAGES = {
+    "project1-merge": {
+        # Needs the EIA workbooks, which aren't in the repo, residential_consumption.csv is kept instead...
+        "script": "Project1/data/merge_sheets.py",
+        "inputs": ["Project1/data/merge_sheets.py", "Project1/data/sheet_cache.py", "Project1/data/*.xls*"],
+        "outputs": ["Project1/data/residential_consumption.csv", "Project1/data/.merge_manifest.json"],
+        "default": False
+    },
+    "project1-extract": {
+        "script": "Project1/data/extract_data.py",
+        "inputs": [
+            "Project1/data/extract_data.py", "Project1/data/sheet_cache.py",
+            "Project1/data/cu-all-multi-year-*.xlsx"
+        ],
+        "outputs": [
+            "Project1/data/food_spending.csv", "Project1/data/food_spending_long.csv",
+            "Project1/data/.extract_manifest.json"
+        ]
+    },
+    "project1-aggregate": {
+        "script": "Project1/data/aggregate.py",
+        "inputs": ["Project1/data/aggregate.py", "Project1/data/residential_consumption.csv"],
+        "outputs": ["Project1/data/residential_cube.csv", "Project1/data/.cube_manifest.json"]
+    },
+    "project2-conv": {
+        "script": "Project2/data/conv.py",
+        "inputs": ["Project2/data/conv.py", "Project2/data/rat*.csv"],
+        "outputs": [
+            "Project2/data/rat*.cleancsv", "Project2/data/rat*.bins.json", "Project2/data/rat*.f32",
+            "Project2/data/rat*.f32.json", "Project2/data/.conv_manifest.json"
+        ]
+    },
+    "project2-metrics": {
+        # Reads the sessions through conv.py's outputs (metrics.load_session), so it runs after project2-conv...
+        "script": "Project2/data/metrics.py",
+        "inputs": [
+            "Project2/data/metrics.py", "Project2/data/conv.py", "Project2/data/rois.json", "Project2/data/rat*.csv",
+            "Project2/data/rat*.cleancsv", "Project2/data/rat*.f32", "Project2/data/rat*.f32.json"
+        ],
+        "outputs": ["Project2/data/metrics_summary.csv", "Project2/data/.metrics_manifest.json"]
+    },
+    "project2-downsample": {
+        "script": "Project2/data/downsample.py",
+        "inputs": [
+            "Project2/data/downsample.py", "Project2/data/metrics.py", "Project2/data/conv.py",
+            "Project2/data/rat*.csv",
+            "Project2/data/rat*.cleancsv", "Project2/data/rat*.f32", "Project2/data/rat*.f32.json"
+        ],
+        "outputs": [
+            "Project2/data/rat*.trace.json", "Project2/data/rat*.trace.*.json", "Project2/data/.trace_manifest.json"
+        ]
+    },
+    "project3-coastline": {
+        "script": "Project3/data/geo_prep.py",
+        "inputs": ["Project3/data/geo_prep.py", "Project3/data/countries-coastline-2km5.geo.json"],
+        "outputs": ["Project3/data/coastline_*.json", "Project3/data/.coastline_manifest.json"]
+    },
+    "project3-polis-index": {
+        "script": "Project3/data/polis_index.py",
+        "inputs": ["Project3/data/polis_index.py", "Project3/data/polis_data_distributed.csv"],
+        "outputs": ["Project3/data/polis_index.json", "Project3/data/.polis_index_manifest.json"]
+    },
+    "project3-polis": {
+        "script": "Project3/data/polis_build.py",
+        "inputs": ["Project3/data/polis_build.py", "Project3/data/polis_data_distributed.csv"],
+        "outputs": ["Project3/data/polis.json", "Project3/data/.polis_manifest.json"]
+    },
+    "project4-sweep": {
+        "script": "Project4/sweep.py",
+        "inputs": ["Project4/sweep.py", "Project4/gprof2dot.py", "Project4/data/callgrind.out.*"],
+        "outputs": ["Project4/data/sweep.json"]
+    },
+    "project5-ingest": {
+        # Needs a local copy of the upstream table, see data/ingest.py --fetch...
+        "script": "Project5/data/ingest.py",
+        "inputs": ["Project5/data/ingest.py", "Project5/data/EUClusters_data.json"],
+        "outputs": ["Project5/data/frequencies.json", "Project5/data/frequencies_index.bin"]
+    },
+}
+
+
+def expand(root: Path, patterns: list[str]) -> tuple[list[str], list[str]]:
+    # Returns (files, patterns matching nothing), files as sorted posix paths relative to root...
+    files = set()
+    missing = []
+    for pattern in patterns:
+        found = [p.relative_to(root).as_posix() for p in root.glob(pattern) if(p.is_file())]
+        if(len(found) == 0):
+            missing.append(pattern)
+        files.update(found)
+    return sorted(files), missing
+
+
+def dependencies(stages: dict) -> dict[str, set[str]]:
+    # A stage depends on another if one of its input patterns could match one of the other's outputs. Literal paths
+    # are matched against the other side's globs, globs against each other are compared as written...
+    def overlaps(a, b):
+        return a == b or fnmatch(a, b) or fnmatch(b, a)
+
+    return {
+        name: {
+            other for other, producer in stages.items()
+            if(other != name and any(overlaps(i, o) for i in stage["inputs"] for o in producer["outputs"]))
+        }
+        for name, stage in stages.items()
+    }
+
+
+def file_hash(p: Path) -> str:
+    return hashlib.sha1(p.read_bytes()).hexdigest()
+
+
+def hash_files(root: Path, files: list[str], known: dict) -> dict[str, str]:
+    # Content hash of each file, reusing the one in known while a file's size and modification time are unchanged
+    # (known is updated with anything hashed again)...
+    hashes = {}
+    for name in files:
+        stat = (root / name).stat()
+        key = [stat.st_size, stat.st_mtime_ns]
+        entry = known.get(name)
+        if(entry is None or entry["stat"] != key):
+            entry = known[name] = {"stat": key, "sha1": file_hash(root / name)}
+        hashes[name] = entry["sha1"]
+    return hashes
+
+
+def output_times(root: Path, files: list[str]) -> dict[str, int]:
+    return {name: (root / name).stat().st_mtime_ns for name in files}
+
+
+def run_stage(root: Path, stage: dict, force: bool = False) -> tuple[int, str, float]:
+    # Returns (exit code, output, seconds). With force the script is passed --force, every prep script takes it to
+    # skip its own up to date check...
+    script = root / stage["script"]
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, script.name, *stage.get("args", []), *(["--force"] if(force) else [])],
+        cwd=script.parent, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    return result.returncode, result.stdout, time.perf_counter() - start
+
+
+def main(args):
+    root = Path(args[0]).resolve().parent
+
+    parser = argparse.ArgumentParser(description="Rebuild the data of every project, skipping unchanged stages.")
+    parser.add_argument(
+        "stages", nargs="*",
+        help=f"Stages to consider (default: all but {', '.join(n for n, s in STAGES.items() if(not s.get('default', True)))})"
+    )
+    parser.add_argument("--force", action="store_true", help="Run the stages even if they're up to date")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Stages run at once (default: cpu count)")
+    parser.add_argument("--list", action="store_true", help="List the stages and what they depend on, then exit")
+    opts = parser.parse_args(args[1:])
+
+    unknown = [name for name in opts.stages if(name not in STAGES)]
+    if(len(unknown) > 0):
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    selected = opts.stages if(len(opts.stages) > 0) else [n for n, s in STAGES.items() if(s.get("default", True))]
+    stages = {name: STAGES[name] for name in selected}
+    # Only selected stages are waited on, outputs of the others are taken as they are on disk...
+    depends = dependencies(stages)
+
+    if(opts.list):
+        for name in stages:
+            print(f"{name:<24} {stages[name]['script']:<32} after: {', '.join(sorted(depends[name])) or '-'}")
+        return
+
+    manifest_file = root / MANIFEST_NAME
+    manifest = {"files": {}, "stages": {}}
+    if(manifest_file.exists()):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    known = manifest["files"]
+
+    status = {}
+    timings = {}
+    pending = dict(depends)
+    running = {}
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max(1, opts.jobs)) as pool:
+        while(len(pending) > 0 or len(running) > 0):
+            # Start everything whose dependencies are done, a failed dependency skips the stage...
+            for name in [n for n, deps in pending.items() if(all(d in status for d in deps))]:
+                del pending[name]
+                stage = stages[name]
+
+                if(any(status[d] in ("failed", "skipped") for d in depends[name])):
+                    status[name] = "skipped"
+                    print(f"[{name}] skipped, a dependency didn't build")
+                    continue
+
+                input_files, missing = expand(root, stage["inputs"])
+                if(len(missing) > 0):
+                    status[name] = "skipped"
+                    print(f"[{name}] skipped, missing inputs: {', '.join(missing)}")
+                    continue
+
+                inputs = hash_files(root, input_files, known)
+                outputs, missing = expand(root, stage["outputs"])
+                record = manifest["stages"].get(name)
+                current = record is not None and record["inputs"] == inputs and len(missing) == 0
+                if(not opts.force and current and record["outputs"] == hash_files(root, outputs, known)):
+                    status[name] = "up to date"
+                    continue
+
+                print(f"[{name}] running {stage['script']}")
+                before = output_times(root, outputs)
+                running[pool.submit(run_stage, root, stage, opts.force)] = (name, inputs, before)
+
+            if(len(running) == 0):
+                if(len(pending) > 0 and not any(all(d in status for d in deps) for deps in pending.values())):
+                    raise ValueError(f"Stages depend on each other: {', '.join(pending)}")
+                continue
+
+            done, __ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, inputs, before = running.pop(future)
+                code, output, seconds = future.result()
+                timings[name] = seconds
+
+                if(output.strip() != ""):
+                    print("\n".join(f"[{name}] {line}" for line in output.rstrip().splitlines()))
+
+                if(code != 0):
+                    status[name] = "failed"
+                    print(f"[{name}] failed with exit code {code}")
+                    continue
+
+                outputs, missing = expand(root, stages[name]["outputs"])
+                if(len(missing) > 0):
+                    print(f"[{name}] warning, no outputs matching: {', '.join(missing)}")
+
+                # A forced stage has to write all of its outputs again, a script still finding them up to date would
+                # otherwise have them recorded as current...
+                untouched = [f for f, t in output_times(root, outputs).items() if(before.get(f) == t)]
+                if(opts.force and len(untouched) > 0):
+                    status[name] = "failed"
+                    print(f"[{name}] failed, --force left outputs untouched: {', '.join(untouched)}")
+                    continue
+
+                status[name] = "built"
+                manifest["stages"][name] = {"inputs": inputs, "outputs": hash_files(root, outputs, known)}
+
+    # Drop hashes of files no stage refers to anymore...
+    used = {f for record in manifest["stages"].values() for part in ("inputs", "outputs") for f in record[part]}
+    manifest["files"] = {name: entry for name, entry in known.items() if(name in used)}
+
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+    print(f"\n{'stage':<24} {'status':<12} {'time':>9}")
+    for name in stages:
+        seconds = f"{timings[name]:8.2f}s" if(name in timings) else ""
+        print(f"{name:<24} {status[name]:<12} {seconds:>9}")
+    print(f"{'total':<24} {'':<12} {time.perf_counter() - start:8.2f}s")
+
+    if(any(s == "failed" for s in status.values())):
+        sys.exit(1)
+
+
+if(__name__ == "__main__"):
+    main(sys.argv)